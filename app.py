@@ -1,10 +1,101 @@
 import tkinter as tk
-from tkinter import scrolledtext
+from tkinter import scrolledtext, simpledialog
 import calendar
+import queue
+import shlex
+import threading
+import time
 import main as backend
+import instrument
+
+# how often (ms) the Tk loop picks up output and prompts from the backend thread
+POLL_MS = 30
+# how often (s) to look for days saved by another kcalendar process
+REFRESH_SECONDS = 2
+# most years the heatmap window shows at once
+HEATMAP_MAX_YEARS = 10
+# the widgets drawn from each setting; changing any other setting repaints
+# nothing
+SETTING_WIDGETS = {"calorie_goal": ("bar", "heatmap")}
+
+
+# =========================
+# Chart data helpers
+# =========================
+# Plain functions over the backend, no Tk, so bench/ can time them too.
+
+def get_week_calories(week_start_date):
+    # returns (labels, values)
+    # labels: ["Mon 01", "Tue 02", ...]
+    # values: [int or None]  (None = no log)
+    labels = []
+    values = []
+
+    for i in range(7):
+        d = week_start_date + backend.datetime.timedelta(days=i)
+        date_str = d.isoformat()
+
+        labels.append(d.strftime("%a %d"))  # Mon 01, Tue 02
+
+        day = backend.kcalendar.get(date_str)
+        if not day:
+            values.append(None)
+            continue
+
+        # sum calories (breakfast/lunch/dinner) ignoring None
+        total = 0
+        for meal in ["breakfast", "lunch", "dinner"]:
+            v = day.get(meal)
+            if v is not None:
+                total += v
+
+        values.append(total)
+
+    return labels, values
+
+def get_week_trend(week_start_date):
+    # shortest-window moving average of total calories, one per weekday
+    week_end = week_start_date + backend.datetime.timedelta(days=6)
+    averages = dict(backend.moving_averages("calories", backend.TREND_WINDOWS[0], week_start_date.isoformat(), week_end.isoformat()))
+    days = [week_start_date + backend.datetime.timedelta(days=i) for i in range(7)]
+    # no line into the future
+    return [averages.get(d.isoformat()) if d <= backend.datetime.date.today() else None for d in days]
+
+def get_day_meals(date_str):
+    day = backend.kcalendar.get(date_str)
+    if not day:
+        return [], []
+    labels, values = [], []
+    for meal in ["breakfast", "lunch", "dinner"]:
+        v = day.get(meal)
+        if v is not None and v > 0:
+            labels.append(meal)
+            values.append(v)
+    return labels, values
+
+def meals_avg(stats):
+    # average of each meal over the days it was logged, from range_stats
+    labels, values = [], []
+    for meal in ["breakfast", "lunch", "dinner"]:
+        avg = stats.mean(meal)
+        if avg is not None and avg > 0:
+            labels.append(meal)
+            values.append(avg)
+    return labels, values
+
+def get_week_meals_avg(week_start_date):
+    week_end = week_start_date + backend.datetime.timedelta(days=6)
+    return meals_avg(backend.range_stats(week_start_date.isoformat(), week_end.isoformat()))
+
+def get_month_meals_avg(year, month):
+    last = calendar.monthrange(year, month)[1]
+    return meals_avg(backend.range_stats(f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-{last:02d}"))
 
 
 def main():
+    # history and settings load in the background while the window is built
+    backend.preload()
+
     # =========================
     # 1) Create the root window
     # =========================
@@ -14,6 +105,11 @@ def main():
 
     def on_close():
         backend.APP_RUNNING = False
+        # let a backend thread blocked at a prompt return
+        input_queue.put(None)
+        backend.flush_saves()
+        # the console is going away with the window, so plain print
+        instrument.report(print, backend.BASE_DIR)
         try:
             root.destroy()
         except:
@@ -36,6 +132,15 @@ def main():
     right.pack(side="right", fill="y", padx=(4, 8), pady=8)
     right.pack_propagate(False)
 
+    # Profile picker (left, above the terminal)
+    profile_bar = tk.Frame(left)
+    profile_bar.pack(fill="x", pady=(0, 6))
+    tk.Label(profile_bar, text="Profile:", font=("Consolas", 10)).pack(side="left")
+    profile_button = tk.Menubutton(profile_bar, text=backend.load_profile(), relief="raised", font=("Consolas", 10))
+    profile_button.pack(side="left", padx=(4, 0))
+    profile_menu = tk.Menu(profile_button, tearoff=False)
+    profile_button.configure(menu=profile_menu)
+
     # Terminal output + input (left)
     output = scrolledtext.ScrolledText(left, wrap="word", state="disabled", font=("Consolas", 10))
     output.pack(fill="both", expand=True, pady=(0, 6))
@@ -76,46 +181,127 @@ def main():
     # =========================
     # 3) GUI terminal bridge (app_print / app_input)
     # =========================
-    waiting_for_input = False
-    input_value = None
-
-    def write_line(text: str):
+    # backend.main_loop runs on its own thread. Whatever it prints or prompts
+    # goes through ui_queue and is written by the Tk loop; lines typed into
+    # the entry go to input_queue, where the blocked app_input picks them up.
+    ui_queue = queue.Queue()
+    input_queue = queue.Queue()
+    waiting_for_input = threading.Event()
+
+    def write_lines(lines):
+        # one insert for everything printed since the last tick, then drop
+        # the oldest lines past the console_max_lines setting
         output.configure(state="normal")
-        output.insert("end", text + "\n")
+        output.insert("end", "\n".join(lines) + "\n")
+        max_lines = backend.get_settings().get("console_max_lines") or 0
+        excess = int(output.index("end-1c").split(".")[0]) - 1 - max_lines
+        if max_lines > 0 and excess > 0:
+            output.delete("1.0", f"{excess + 1}.0")
         output.see("end")
         output.configure(state="disabled")
 
+    def write_line(text: str):
+        write_lines([text])
+
     def on_enter(event=None):
-        nonlocal waiting_for_input, input_value
         text = entry.get()
         entry.delete(0, "end")
 
-        if waiting_for_input:
-            input_value = text
-            waiting_for_input = False
-            return
-
-        if text.strip():
+        if not waiting_for_input.is_set() and text.strip():
+            # backend is busy, keep the line for its next prompt
             write_line("> " + text.strip())
+        input_queue.put(text)
 
     entry.bind("<Return>", on_enter)
 
     def gui_print(*args):
         # behaves like print(): supports multiple args
-        write_line(" ".join(str(a) for a in args))
+        ui_queue.put(("print", " ".join(str(a) for a in args)))
 
     def gui_input(prompt=""):
-        nonlocal waiting_for_input, input_value
-        write_line(str(prompt))
-        entry.focus()
-        waiting_for_input = True
-        input_value = None
-        while waiting_for_input and backend.APP_RUNNING:
-            root.update()
-        return input_value
+        if not backend.APP_RUNNING:
+            return "quit"
+        ui_queue.put(("print", str(prompt)))
+        waiting_for_input.set()
+        try:
+            text = input_queue.get()
+        finally:
+            waiting_for_input.clear()
+        if text is None:
+            # window closed while waiting, unwind whatever prompt we were in
+            return "quit"
+        return text
+
+    def pump():
+        printed = []
+        while True:
+            try:
+                kind, payload = ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "print":
+                printed.append(payload)
+            elif kind == "day":
+                day_changed(payload)
+            elif kind == "settings":
+                mark_dirty(*{name for key in payload for name in SETTING_WIDGETS[key]})
+            elif kind == "profile":
+                profile_button.configure(text=payload)
+                printed.append(f"profile: {payload}")
+                mark_dirty("calendar", "bar", "pie", "heatmap")
+            elif kind == "quit":
+                on_close()
+                return
+        if printed:
+            write_lines(printed)
+        root.after(POLL_MS, pump)
+
+    # the SETTING_WIDGETS settings as last heard, to tell which ones a save
+    # changed; empty until the first save and after a profile switch, when
+    # they all count as changed
+    seen_settings = {}
+
+    def settings_saved(settings):
+        changed = [key for key in SETTING_WIDGETS if key not in seen_settings or settings.get(key) != seen_settings[key]]
+        seen_settings.update((key, settings.get(key)) for key in SETTING_WIDGETS)
+        if changed:
+            ui_queue.put(("settings", changed))
+
+    def profile_switched(name):
+        seen_settings.clear()
+        ui_queue.put(("profile", name))
 
     backend.app_print = gui_print
     backend.app_input = gui_input
+    # change notifications arrive on the backend thread, hand them to pump()
+    backend.day_listeners.append(lambda date_str, old, new: ui_queue.put(("day", date_str)))
+    backend.settings_listeners.append(settings_saved)
+    backend.profile_listeners.append(profile_switched)
+
+    def pick_profile(name):
+        # only between commands: a prompt half way through a log would
+        # otherwise finish it in the other profile
+        if backend.COMMAND_RUNNING:
+            write_line("finish the current command first (or type: profile NAME)")
+            return
+        if not name:
+            return
+        # run on the backend thread like a typed command, so finishing the
+        # old profile's saves never holds up the window
+        input_queue.put(shlex.join(["profile", name]))
+
+    def fill_profile_menu():
+        profile_menu.delete(0, "end")
+        for name in backend.list_profiles():
+            label = f"* {name}" if name == backend.load_profile() else f"  {name}"
+            profile_menu.add_command(label=label, command=lambda name=name: pick_profile(name))
+        profile_menu.add_separator()
+        profile_menu.add_command(
+            label="New profile...",
+            command=lambda: pick_profile(simpledialog.askstring("New profile", "profile name:", parent=root)),
+        )
+
+    profile_menu.configure(postcommand=fill_profile_menu)
 
     # =========================
     # 4) App state (shared GUI state)
@@ -156,21 +342,12 @@ def main():
     def is_logged(date_str: str) -> bool:
         return date_str in backend.kcalendar
 
-    def draw_calendar():
-        nonlocal cal_year, cal_month, selected_date
-
+    # Items are created once per canvas size and then only retexted or
+    # shown/hidden, so changing month or selection does not rebuild the grid.
+    def build_calendar(w, h):
         c = cal_canvas
         c.delete("all")
 
-        w = c.winfo_width()
-        h = c.winfo_height()
-        if w <= 1 or h <= 1:
-            root.after(50, draw_calendar)
-            return
-
-        # update title label in header
-        cal_frame.title_lbl.config(text=f"{calendar.month_name[cal_month]} {cal_year}")
-
         pad = 10
         header_h = 0  # title is in header now
         dow_h = 20
@@ -192,38 +369,65 @@ def main():
             y = header_h
             c.create_text(x, y, anchor="nw", text=name, font=("Consolas", 9))
 
-        first = first_weekday(cal_year, cal_month)
-        total_days = days_in_month(cal_year, cal_month)
-
-        c.day_cells = []
-        day_num = 1
-
+        cells = []
         for r in range(rows):
             for col in range(cols):
-                index = r * cols + col
                 x1 = grid_left + col * cell_w
                 y1 = grid_top + r * cell_h
                 x2 = x1 + cell_w
                 y2 = y1 + cell_h
 
                 c.create_rectangle(x1, y1, x2, y2)
+                cells.append({
+                    "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+                    # selection highlight, day number, tick if logged
+                    "select": c.create_rectangle(x1 + 1, y1 + 1, x2 - 1, y2 - 1, width=2, state="hidden"),
+                    "num": c.create_text(x1 + 4, y1 + 2, anchor="nw", text="", font=("Consolas", 10)),
+                    "tick": c.create_text(x2 - 10, y1 + 2, anchor="ne", text="✓", font=("Consolas", 12, "bold"), state="hidden"),
+                    "shown": ("", False, False),
+                })
+        c.items = {"size": (w, h), "cells": cells}
+
+    def draw_calendar():
+        nonlocal cal_year, cal_month, selected_date
 
-                if index >= first and day_num <= total_days:
-                    date_str = f"{cal_year:04d}-{cal_month:02d}-{day_num:02d}"
+        c = cal_canvas
+
+        w = c.winfo_width()
+        h = c.winfo_height()
+        if w <= 1 or h <= 1:
+            return
 
-                    # selection highlight
-                    if date_str == selected_date:
-                        c.create_rectangle(x1 + 1, y1 + 1, x2 - 1, y2 - 1, width=2)
+        if getattr(c, "items", None) is None or c.items["size"] != (w, h):
+            build_calendar(w, h)
 
-                    # day number
-                    c.create_text(x1 + 4, y1 + 2, anchor="nw", text=str(day_num), font=("Consolas", 10))
+        # update title label in header
+        cal_frame.title_lbl.config(text=f"{calendar.month_name[cal_month]} {cal_year}")
 
-                    # tick if logged
-                    if is_logged(date_str):
-                        c.create_text(x2 - 10, y1 + 2, anchor="ne", text="✓", font=("Consolas", 12, "bold"))
+        first = first_weekday(cal_year, cal_month)
+        total_days = days_in_month(cal_year, cal_month)
 
-                    c.day_cells.append({"date": date_str, "x1": x1, "y1": y1, "x2": x2, "y2": y2})
-                    day_num += 1
+        c.day_cells = []
+        for index, cell in enumerate(c.items["cells"]):
+            day_num = index - first + 1
+            if 1 <= day_num <= total_days:
+                date_str = f"{cal_year:04d}-{cal_month:02d}-{day_num:02d}"
+                shown = (str(day_num), date_str == selected_date, is_logged(date_str))
+                c.day_cells.append({"date": date_str, "x1": cell["x1"], "y1": cell["y1"], "x2": cell["x2"], "y2": cell["y2"]})
+            else:
+                shown = ("", False, False)
+
+            # only touch the items whose text or visibility actually changed
+            if shown == cell["shown"]:
+                continue
+            text, selected, ticked = shown
+            if text != cell["shown"][0]:
+                c.itemconfig(cell["num"], text=text)
+            if selected != cell["shown"][1]:
+                c.itemconfig(cell["select"], state="normal" if selected else "hidden")
+            if ticked != cell["shown"][2]:
+                c.itemconfig(cell["tick"], state="normal" if ticked else "hidden")
+            cell["shown"] = shown
 
     def on_calendar_click(event):
         nonlocal selected_date, pie_mode, pie_week_start
@@ -245,8 +449,7 @@ def main():
                 pie_week_start = week_start_for(d)
 
                 backend.app_print("Selected date:", selected_date)
-                draw_calendar()
-                draw_pie()
+                mark_dirty("calendar", "pie")
                 return
 
     cal_canvas.bind("<Button-1>", on_calendar_click)
@@ -261,7 +464,9 @@ def main():
         elif cal_month > 12:
             cal_month = 1
             cal_year += 1
-        draw_calendar()
+        mark_dirty("calendar")
+        if pie_mode == "month":
+            mark_dirty("pie")
 
     btn_next = tk.Button(cal_header, text=">>", width=4, command=lambda: change_month(1))
     btn_next.pack(side="right", padx=(4, 0))
@@ -271,71 +476,84 @@ def main():
 
     # bar graph data + drawing
 
-    def get_week_calories(week_start_date):
-        # returns (labels, values)
-        # labels: ["Mon 01", "Tue 02", ...]
-        # values: [int or None]  (None = no log)
-        labels = []
-        values = []
+    def build_bar(w, h):
+        c = bar_canvas
+        c.delete("all")
 
-        for i in range(7):
-            d = week_start_date + backend.datetime.timedelta(days=i)
-            date_str = d.isoformat()
+        # Chart area
+        pad_left = 30
+        pad_right = 10
+        pad_top = 50
+        pad_bottom = 28
 
-            labels.append(d.strftime("%a %d"))  # Mon 01, Tue 02
+        x0 = pad_left
+        y0 = pad_top
+        x1 = w - pad_right
+        y1 = h - pad_bottom
 
-            day = backend.kcalendar.get(date_str)
-            if not day:
-                values.append(None)
-                continue
+        # Bar sizing
+        n = 7
+        gap = 8
+        bar_w = (x1 - x0 - gap * (n - 1)) / n
+
+        items = {"size": (w, h), "area": (x0, y0, x1, y1)}
 
-            # sum calories (breakfast/lunch/dinner) ignoring None
-            total = 0
-            for meal in ["breakfast", "lunch", "dinner"]:
-                v = day.get(meal)
-                if v is not None:
-                    total += v
+        # Title
+        items["title"] = c.create_text(3, 0, anchor="nw", text="", font=("Consolas", 10, "bold"))
+        items["empty"] = c.create_text(w // 2, h // 2, text="No week data", font=("Consolas", 10), state="hidden")
 
-            values.append(total)
+        # everything below is tagged "chart" so it can be hidden in one call
+        c.create_line(x0, y1, x1, y1, tags="chart")  # baseline
 
-        return labels, values
+        items["bars"] = []
+        for i in range(n):
+            bx1 = x0 + i * (bar_w + gap)
+            bx2 = bx1 + bar_w
+            items["bars"].append({
+                "x1": bx1, "x2": bx2,
+                "label": c.create_text((bx1 + bx2) / 2, y1 + 6, anchor="n", text="", font=("Consolas", 8), tags="chart"),
+                "rect": c.create_rectangle(bx1, y1, bx2, y1, outline="", fill="#7aa2ff", tags="chart"),
+                "value": c.create_text((bx1 + bx2) / 2, y1, anchor="s", text="", font=("Consolas", 8), tags="chart"),
+                "gap": c.create_text((bx1 + bx2) / 2, (y0 + y1) / 2, text="—", font=("Consolas", 14), tags="chart"),
+            })
+
+        # moving average of total calories, drawn over the bars
+        items["trend"] = c.create_line(x0, y1, x1, y1, fill="#ff8c42", width=2, tags="chart")
+        items["trend_text"] = c.create_text(x1, 16, anchor="ne", text="", fill="#ff8c42", font=("Consolas", 8), tags="chart")
+
+        items["goal_line"] = c.create_line(x0, y1, x1, y1, dash=(4, 2), tags="chart")
+        items["goal_text"] = c.create_text(x0 - 4, y1, anchor="e", text="", font=("Consolas", 8, "bold"), tags="chart")
+        c.items = items
 
     def draw_bar_week():
         nonlocal bar_week_start
 
         c = bar_canvas
-        c.delete("all")
 
         w = c.winfo_width()
         h = c.winfo_height()
         if w <= 1 or h <= 1:
-            root.after(50, draw_bar_week)
             return
 
+        if getattr(c, "items", None) is None or c.items["size"] != (w, h):
+            build_bar(w, h)
+        items = c.items
+        x0, y0, x1, y1 = items["area"]
+
         labels, values = get_week_calories(bar_week_start)
         goal = backend.user_settings.get("calorie_goal")
+        trend = get_week_trend(bar_week_start)
 
-        # Title
-        c.create_text(3, 0, anchor="nw",
-                    text=f"Week of {bar_week_start.isoformat()}",
-                    font=("Consolas", 10, "bold"))
-
-        # Chart area
-        pad_left = 30
-        pad_right = 10
-        pad_top = 50
-        pad_bottom = 28
-
-        x0 = pad_left
-        y0 = pad_top
-        x1 = w - pad_right
-        y1 = h - pad_bottom
+        c.itemconfig(items["title"], text=f"Week of {bar_week_start.isoformat()}")
 
         # Find max (avoid divide by zero)
         nums = [v for v in values if v is not None]
         if not nums:
-            c.create_text(w // 2, h // 2, text="No week data", font=("Consolas", 10))
+            c.itemconfig("chart", state="hidden")
+            c.itemconfig(items["empty"], state="normal")
             return
+        c.itemconfig(items["empty"], state="hidden")
+        c.itemconfig("chart", state="normal")
 
         max_day = max(nums)
         max_val = max_day
@@ -344,49 +562,56 @@ def main():
         if goal is not None and goal > max_val:
             max_val = goal
 
+        # and the trend line
+        trend_nums = [v for v in trend if v is not None]
+        if trend_nums and max(trend_nums) > max_val:
+            max_val = max(trend_nums)
+
         if max_val <= 0:
             max_val = 1
 
-        # Bar sizing
-        n = 7
-        gap = 8
-        bar_w = (x1 - x0 - gap * (n - 1)) / n
-
-        # Axes line
-        c.create_line(x0, y1, x1, y1)  # baseline
-
-        
-
-        for i in range(n):
-            v = values[i]
-            bx1 = x0 + i * (bar_w + gap)
-            bx2 = bx1 + bar_w
-
-            # x label
-            c.create_text((bx1 + bx2) / 2, y1 + 6, anchor="n", text=labels[i], font=("Consolas", 8))
+        for bar, label, v in zip(items["bars"], labels, values):
+            c.itemconfig(bar["label"], text=label)
 
             # gap if no data
             if v is None:
-                c.create_text((bx1 + bx2) / 2, (y0 + y1) / 2, text="—", font=("Consolas", 14))
+                c.itemconfig(bar["rect"], state="hidden")
+                c.itemconfig(bar["value"], state="hidden")
                 continue
+            c.itemconfig(bar["gap"], state="hidden")
 
             bar_h = (v / max_val) * (y1 - y0)
             top = y1 - bar_h
 
-            c.create_rectangle(bx1, top, bx2, y1, outline="", fill="#7aa2ff")
+            c.coords(bar["rect"], bar["x1"], top, bar["x2"], y1)
             label_y = max(top -4, y0 + 2)
-            c.create_text((bx1 + bx2) / 2, label_y, anchor="s", text=str(v), font=("Consolas", 8))
-        
-        
+            c.coords(bar["value"], (bar["x1"] + bar["x2"]) / 2, label_y)
+            c.itemconfig(bar["value"], text=str(v))
+
+        points = []
+        for bar, v in zip(items["bars"], trend):
+            if v is not None:
+                points += [(bar["x1"] + bar["x2"]) / 2, y1 - (v / max_val) * (y1 - y0)]
+        if len(points) >= 4:
+            c.coords(items["trend"], *points)
+            c.itemconfig(items["trend_text"], text=f"{backend.TREND_WINDOWS[0]}-day avg")
+        else:
+            c.itemconfig(items["trend"], state="hidden")
+            c.itemconfig(items["trend_text"], state="hidden")
+
         if goal is not None and goal > 0:
             goal_y = y1 - (goal / max_val) * (y1 - y0)
-            c.create_line(x0, goal_y, x1, goal_y, dash=(4, 2))
-            c.create_text(x0 - 4, goal_y, anchor="e", text=f"{goal:.0f}", font=("Consolas", 8, "bold"))
+            c.coords(items["goal_line"], x0, goal_y, x1, goal_y)
+            c.coords(items["goal_text"], x0 - 4, goal_y)
+            c.itemconfig(items["goal_text"], text=f"{goal:.0f}")
+        else:
+            c.itemconfig(items["goal_line"], state="hidden")
+            c.itemconfig(items["goal_text"], state="hidden")
 
     def change_bar_week(delta_weeks):
         nonlocal bar_week_start
         bar_week_start = bar_week_start + backend.datetime.timedelta(days=7 * delta_weeks)
-        draw_bar_week()
+        mark_dirty("bar")
 
     btn_bar_prev.config(command=lambda: change_bar_week(-1))
     btn_bar_next.config(command=lambda: change_bar_week(1))
@@ -396,128 +621,91 @@ def main():
         nonlocal bar_week_start, selected_date
         d = backend.datetime.date.fromisoformat(selected_date)
         bar_week_start = week_start_for(d)
-        draw_bar_week()
+        mark_dirty("bar")
         backend.app_print("Bar graph set to week of:", bar_week_start.isoformat())
     bar_canvas.bind("<Button-1>", on_bar_click)
 
     # =========================
     # 6) Pie chart data + drawing + mode buttons
     # =========================
-    def get_day_meals(date_str):
-        day = backend.kcalendar.get(date_str)
-        if not day:
-            return [], []
-        labels, values = [], []
-        for meal in ["breakfast", "lunch", "dinner"]:
-            v = day.get(meal)
-            if v is not None and v > 0:
-                labels.append(meal)
-                values.append(v)
-        return labels, values
-
-    def get_week_meals_avg(week_start_date):
-        totals = {"breakfast": 0, "lunch": 0, "dinner": 0}
-        counts = {"breakfast": 0, "lunch": 0, "dinner": 0}
-
-        for i in range(7):
-            d = week_start_date + backend.datetime.timedelta(days=i)
-            date_str = d.isoformat()
-            day = backend.kcalendar.get(date_str)
-            if not day:
-                continue
 
-            for meal in ["breakfast", "lunch", "dinner"]:
-                v = day.get(meal)
-                if v is not None and v > 0:
-                    totals[meal] += v
-                    counts[meal] += 1
+    def build_pie(w, h):
+        c = pie_canvas
+        c.delete("all")
 
-        labels, values = [], []
-        for meal in ["breakfast", "lunch", "dinner"]:
-            if counts[meal] > 0:
-                labels.append(meal)
-                values.append(totals[meal] / counts[meal])
-        return labels, values
-
-    def get_month_meals_avg(year, month):
-        totals = {"breakfast": 0, "lunch": 0, "dinner": 0}
-        counts = {"breakfast": 0, "lunch": 0, "dinner": 0}
-
-        month_key = f"{year:04d}-{month:02d}"
-        for date_str, day in backend.kcalendar.items():
-            if not date_str.startswith(month_key) or not day:
-                continue
-            for meal in ["breakfast", "lunch", "dinner"]:
-                v = day.get(meal)
-                if v is not None and v > 0:
-                    totals[meal] += v
-                    counts[meal] += 1
+        items = {"size": (w, h)}
+        items["title"] = c.create_text(10, 8, anchor="nw", text="", font=("Consolas", 10, "bold"))
+        items["empty"] = c.create_text(w // 2, h // 2, text="No meal data", font=("Consolas", 10), state="hidden")
 
-        labels, values = [], []
-        for meal in ["breakfast", "lunch", "dinner"]:
-            if counts[meal] > 0:
-                labels.append(meal)
-                values.append(totals[meal] / counts[meal])
-        return labels, values
+        cx = w // 2 + 80
+        cy = h // 2 - 10
+        r = min(w, h) // 2 - 18
+        items["fits"] = r > 5
+
+        # one slice and one legend row per meal, hidden until used
+        items["arcs"] = []
+        items["legend"] = []
+        y = 28
+        for _ in meal_colors:
+            items["arcs"].append(c.create_arc(cx - r, cy - r, cx + r, cy + r, start=0, extent=0, outline="white", state="hidden"))
+            items["legend"].append((
+                c.create_rectangle(10, y + 3, 22, y + 15, outline="", state="hidden"),
+                c.create_text(28, y, anchor="nw", text="", state="hidden"),
+            ))
+            y += 18
+        # total calories (below legend)
+        items["line"] = c.create_line(10, 0, 150, 0, fill="#888888", state="hidden")
+        items["total"] = c.create_text(10, 0, anchor="nw", text="", font=("Consolas", 10, "bold"), state="hidden")
+        c.items = items
 
     def draw_pie_generic(labels, values, title=""):
         w = pie_canvas.winfo_width()
         h = pie_canvas.winfo_height()
         if w <= 1 or h <= 1:
-            root.after(50, lambda: draw_pie_generic(labels, values, title))
             return
 
         c = pie_canvas
-        c.delete("all")
-
-        if title:
-            c.create_text(10, 8, anchor="nw", text=title, font=("Consolas", 10, "bold"))
-
-        if not values:
-            c.create_text(w // 2, h // 2, text="No meal data", font=("Consolas", 10))
+        if getattr(c, "items", None) is None or c.items["size"] != (w, h):
+            build_pie(w, h)
+        items = c.items
+
+        c.itemconfig(items["title"], text=title)
+        c.itemconfig(items["empty"], state="normal" if not values else "hidden")
+
+        shown = len(values) if values and items["fits"] else 0
+        for i, (arc, (swatch, text)) in enumerate(zip(items["arcs"], items["legend"])):
+            state = "normal" if i < shown else "hidden"
+            c.itemconfig(arc, state=state)
+            c.itemconfig(swatch, state=state)
+            c.itemconfig(text, state=state)
+        c.itemconfig(items["line"], state="normal" if shown else "hidden")
+        c.itemconfig(items["total"], state="normal" if shown else "hidden")
+        if not shown:
             return
 
         total = sum(values)
-        cx = w // 2 + 80
-        cy = h // 2 - 10
-        r = min(w, h) // 2 - 18
-        if r <= 5:
-            return
-
         start = 0
-        for label, value in zip(labels, values):
+        for arc, label, value in zip(items["arcs"], labels, values):
             extent = value / total * 360
             if len(values) == 1:
                 extent = 359.9
 
-            c.create_arc(
-                cx - r, cy - r, cx + r, cy + r,
-                start=start,
-                extent=extent,
-                fill=meal_colors.get(label, "#cccccc"),
-                outline="white"
-            )
+            c.itemconfig(arc, start=start, extent=extent, fill=meal_colors.get(label, "#cccccc"))
             start += extent
 
         # legend
         y = 28
-        for label, value in zip(labels, values):
-            col = meal_colors.get(label, "#cccccc")
-            c.create_rectangle(10, y + 3, 22, y + 15, fill=col, outline="")
-            c.create_text(28, y, anchor="nw", text=f"{label}: {value:.0f}")
+        for (swatch, text), label, value in zip(items["legend"], labels, values):
+            c.itemconfig(swatch, fill=meal_colors.get(label, "#cccccc"))
+            c.itemconfig(text, text=f"{label}: {value:.0f}")
             y += 18
         # total calories (below legend)
         total_cals = sum(values)
         y += 6
-        c.create_line(10, y, 150, y, fill="#888888")
+        c.coords(items["line"], 10, y, 150, y)
         y += 6
-        c.create_text(
-            10,
-            y,
-            anchor="nw",
-            text=f"Total: {total_cals:.0f} kcal",
-            font=("Consolas", 10, "bold")
-        )
+        c.coords(items["total"], 10, y)
+        c.itemconfig(items["total"], text=f"Total: {total_cals:.0f} kcal")
 
     def draw_pie():
         nonlocal pie_mode, pie_week_start, selected_date, cal_year, cal_month
@@ -545,7 +733,7 @@ def main():
             d = backend.datetime.date.fromisoformat(selected_date)
             pie_week_start = week_start_for(d)
 
-        draw_pie()
+        mark_dirty("pie")
 
     btn_pie_month = tk.Button(pie_header, text="Month", width=6, command=lambda: set_pie_mode("month"))
     btn_pie_week = tk.Button(pie_header, text="Week", width=6, command=lambda: set_pie_mode("week"))
@@ -556,19 +744,252 @@ def main():
     btn_pie_day.pack(side="right")
 
     # =========================
-    # 7) Startup actions (draw + backend start)
+    # 7) Year heatmap (separate window)
+    # =========================
+    # One cell per day, a row of 7 weekdays by up to 54 weeks per year,
+    # coloured by backend.year_buckets(). Like the small canvases, cells are
+    # created once per window size / year count and only recoloured after.
+    heat_colors = {
+        backend.NO_LOG: "#ebedf0",
+        backend.LOGGED: "#7aa2ff",
+        backend.WELL_UNDER: "#9be9a8",
+        backend.UNDER: "#40c463",
+        backend.OVER: "#ffb366",
+        backend.WELL_OVER: "#ff6b6b",
+    }
+    heat_win = None
+    heat_canvas = None
+    heat_last_year = today.year
+    heat_years = 1
+
+    def heat_first_year():
+        return heat_last_year - heat_years + 1
+
+    def build_heatmap(w, h):
+        c = heat_canvas
+        c.delete("all")
+
+        pad = 8
+        label_w = 40
+        legend_h = 24
+        # 8 cell rows per year: 7 weekdays and a gap
+        cell = min((w - label_w - pad) / 54, (h - pad - legend_h) / (heat_years * 8))
+        cell = max(cell, 2)
+
+        blocks = []
+        for b in range(heat_years):
+            top = pad + b * 8 * cell
+            cells = []
+            for index in range(54 * 7):
+                x = label_w + (index // 7) * cell
+                y = top + (index % 7) * cell
+                cells.append(c.create_rectangle(x, y, x + cell - 1, y + cell - 1, outline="", state="hidden"))
+            blocks.append({
+                "label": c.create_text(4, top, anchor="nw", text="", font=("Consolas", 9)),
+                "cells": cells,
+                "fills": [None] * len(cells),
+            })
+
+        # legend
+        x = label_w
+        y = pad + heat_years * 8 * cell + 4
+        legend = {}
+        for bucket, text in [
+            (backend.WELL_UNDER, "<90%"), (backend.UNDER, "<=goal"),
+            (backend.OVER, "<=110%"), (backend.WELL_OVER, ">110%"), (backend.LOGGED, "logged"),
+        ]:
+            legend[bucket] = (
+                c.create_rectangle(x, y + 3, x + 10, y + 13, fill=heat_colors[bucket], outline=""),
+                c.create_text(x + 14, y, anchor="nw", text=text, font=("Consolas", 8)),
+            )
+            x += 70
+        c.items = {"size": (w, h), "years": heat_years, "cell": cell, "pad": pad, "label_w": label_w,
+                   "blocks": blocks, "legend": legend}
+
+    def draw_heatmap():
+        c = heat_canvas
+        if c is None:
+            return
+
+        w = c.winfo_width()
+        h = c.winfo_height()
+        if w <= 1 or h <= 1:
+            return
+
+        items = getattr(c, "items", None)
+        if items is None or items["size"] != (w, h) or items["years"] != heat_years:
+            build_heatmap(w, h)
+            items = c.items
+
+        first = heat_first_year()
+        heat_win.title(f"kcalendar — {first}" + (f" to {heat_last_year}" if heat_years > 1 else ""))
+
+        # with a goal the days are coloured against it, otherwise just logged
+        has_goal = bool(backend.user_settings.get("calorie_goal"))
+        for bucket, (swatch, text) in items["legend"].items():
+            state = "normal" if (bucket == backend.LOGGED) != has_goal else "hidden"
+            c.itemconfig(swatch, state=state)
+            c.itemconfig(text, state=state)
+
+        for b, block in enumerate(items["blocks"]):
+            year = first + b
+            c.itemconfig(block["label"], text=str(year))
+            buckets = backend.year_buckets(year)
+            offset = backend.datetime.date(year, 1, 1).weekday()
+            for index, item in enumerate(block["cells"]):
+                day = index - offset
+                fill = heat_colors[buckets[day]] if 0 <= day < len(buckets) else None
+                if fill == block["fills"][index]:
+                    continue
+                if fill is None:
+                    c.itemconfig(item, state="hidden")
+                else:
+                    c.itemconfig(item, fill=fill, state="normal")
+                block["fills"][index] = fill
+
+    def on_heatmap_click(event):
+        nonlocal selected_date, cal_year, cal_month, pie_mode, pie_week_start
+        items = getattr(heat_canvas, "items", None)
+        if items is None:
+            return
+        cell = items["cell"]
+        b = int((event.y - items["pad"]) // (8 * cell))
+        row = int((event.y - items["pad"] - b * 8 * cell) // cell)
+        col = int((event.x - items["label_w"]) // cell)
+        if not (0 <= b < heat_years and 0 <= row < 7 and 0 <= col < 54):
+            return
+        year = heat_first_year() + b
+        jan1 = backend.datetime.date(year, 1, 1)
+        d = jan1 + backend.datetime.timedelta(days=col * 7 + row - jan1.weekday())
+        if d.year != year:
+            return
+
+        # same as a calendar click, and the calendar jumps to that month
+        selected_date = d.isoformat()
+        cal_year, cal_month = d.year, d.month
+        pie_mode = "day"
+        pie_week_start = week_start_for(d)
+        backend.app_print("Selected date:", selected_date)
+        mark_dirty("calendar", "pie")
+
+    def change_heatmap(shift=0, years=0):
+        nonlocal heat_last_year, heat_years
+        heat_last_year += shift
+        heat_years = min(max(heat_years + years, 1), HEATMAP_MAX_YEARS)
+        mark_dirty("heatmap")
+
+    def close_heatmap():
+        nonlocal heat_win, heat_canvas
+        heat_win.destroy()
+        heat_win = None
+        heat_canvas = None
+        dirty.discard("heatmap")
+
+    def open_heatmap():
+        nonlocal heat_win, heat_canvas, heat_last_year
+        if heat_win is not None:
+            heat_win.lift()
+            return
+        heat_last_year = cal_year
+
+        heat_win = tk.Toplevel(root)
+        heat_win.geometry("760x360")
+        heat_win.protocol("WM_DELETE_WINDOW", close_heatmap)
+
+        header = tk.Frame(heat_win)
+        header.pack(fill="x", padx=6, pady=(6, 0))
+        tk.Label(header, text="Calories vs goal", font=("Consolas", 10, "bold")).pack(side="left")
+        tk.Button(header, text=">>", width=4, command=lambda: change_heatmap(shift=1)).pack(side="right", padx=(4, 0))
+        tk.Button(header, text="<<", width=4, command=lambda: change_heatmap(shift=-1)).pack(side="right")
+        tk.Button(header, text="+ year", width=7, command=lambda: change_heatmap(years=1)).pack(side="right", padx=(0, 4))
+        tk.Button(header, text="- year", width=7, command=lambda: change_heatmap(years=-1)).pack(side="right")
+
+        heat_canvas = tk.Canvas(heat_win, highlightthickness=0)
+        heat_canvas.pack(fill="both", expand=True, padx=6, pady=6)
+        heat_canvas.bind("<Configure>", lambda event: mark_dirty("heatmap"))
+        heat_canvas.bind("<Button-1>", on_heatmap_click)
+
+    btn_year = tk.Button(cal_header, text="Year", width=5, command=open_heatmap)
+    btn_year.pack(side="right", padx=(0, 4))
+
+    # =========================
+    # 8) Redraw scheduler
+    # =========================
+    # Nothing draws directly: handlers and backend notifications mark the
+    # affected widgets dirty, and a single after_idle pass repaints each
+    # dirty widget once, however many changes came in before it ran.
+    painters = {
+        "calendar": draw_calendar,
+        "bar": draw_bar_week,
+        "pie": draw_pie,
+        "heatmap": draw_heatmap,
+    }
+    dirty = set()
+    redraw_pending = False
+
+    def mark_dirty(*widgets):
+        nonlocal redraw_pending
+        dirty.update(widgets)
+        if not redraw_pending:
+            redraw_pending = True
+            root.after_idle(redraw)
+
+    def redraw():
+        nonlocal redraw_pending
+        redraw_pending = False
+        widgets = list(dirty)
+        dirty.clear()
+        for name in widgets:
+            with instrument.timed(f"draw {name}"):
+                painters[name]()
+
+    def day_changed(date_str):
+        # only the widgets currently showing date_str
+        try:
+            d = backend.datetime.date.fromisoformat(date_str)
+        except ValueError:
+            return
+        if (d.year, d.month) == (cal_year, cal_month):
+            mark_dirty("calendar")
+        # the bar chart's trend line reaches back a window before the week
+        lead_in = backend.datetime.timedelta(days=backend.TREND_WINDOWS[0] - 1)
+        if bar_week_start - lead_in <= d < bar_week_start + backend.datetime.timedelta(days=7):
+            mark_dirty("bar")
+        if pie_mode == "day" and date_str == selected_date:
+            mark_dirty("pie")
+        elif pie_mode == "week" and pie_week_start <= d < pie_week_start + backend.datetime.timedelta(days=7):
+            mark_dirty("pie")
+        elif pie_mode == "month" and (d.year, d.month) == (cal_year, cal_month):
+            mark_dirty("pie")
+        if heat_win is not None and heat_first_year() <= d.year <= heat_last_year:
+            mark_dirty("heatmap")
+
+    # =========================
+    # 9) Startup actions (draw + backend start)
     # =========================
-    root.after(100, draw_calendar)
-    root.after(150, draw_pie)
-    root.after(150, draw_bar_week)
+    # the first <Configure> of each canvas paints it; a resize is the only
+    # thing that rebuilds the canvas items
+    cal_canvas.bind("<Configure>", lambda event: mark_dirty("calendar"))
+    bar_canvas.bind("<Configure>", lambda event: mark_dirty("bar"))
+    pie_canvas.bind("<Configure>", lambda event: mark_dirty("pie"))
     def run_backend():
-        backend.main_loop()
-        root.after(0, on_close)
-    root.after(0, run_backend)
+        instrument.run(backend.main_loop)
+        ui_queue.put(("quit", None))
+    threading.Thread(target=run_backend, daemon=True).start()
+
+    def watch_files():
+        # changed days reach pump() through day_listeners like any other
+        while backend.APP_RUNNING:
+            time.sleep(REFRESH_SECONDS)
+            backend.kcalendar.refresh()
+    threading.Thread(target=watch_files, daemon=True).start()
+    root.after(0, pump)
 
     write_line("kcalendar GUI — terminal mode")
     root.mainloop()
 
 
 if __name__ == "__main__":
+    import sys
+    sys.argv = instrument.configure_from_argv(sys.argv)
     main()
@@ -0,0 +1 @@
+# benchmarks: python -m bench.run --help
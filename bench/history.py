@@ -0,0 +1,52 @@
+import datetime
+import json
+import os
+import random
+from storage import DAY_KEYS
+
+
+def generate_history(years, end=None, seed=0):
+    # (date, day) pairs, oldest first, for years * 365 days up to end
+    # (yesterday by default): skipped days and runs of days, meals, protein
+    # and burnt left as None now and then, weight logged on some days as a
+    # slow random walk
+    rng = random.Random(seed)
+    end = end or datetime.date.today() - datetime.timedelta(days=1)
+    day = end - datetime.timedelta(days=years * 365 - 1)
+    weight = rng.uniform(70, 100)
+
+    while day <= end:
+        if rng.random() < 0.03:
+            # a break of up to two weeks
+            day += datetime.timedelta(days=rng.randint(1, 14))
+            continue
+        if rng.random() < 0.1:
+            day += datetime.timedelta(days=1)
+            continue
+
+        weight = min(max(weight + rng.gauss(0, 0.3), 45), 160)
+        log = {
+            "breakfast": None if rng.random() < 0.15 else rng.randint(150, 700),
+            "lunch": None if rng.random() < 0.08 else rng.randint(300, 900),
+            "dinner": None if rng.random() < 0.08 else rng.randint(400, 1100),
+            "protein": None if rng.random() < 0.25 else rng.randint(40, 180),
+            "burnt": None if rng.random() < 0.6 else rng.randint(100, 800),
+            "weight": round(weight, 1) if rng.random() < 0.45 else None,
+        }
+        yield day.isoformat(), {key: log[key] for key in DAY_KEYS}
+        day += datetime.timedelta(days=1)
+
+
+def write_history(directory, years, storage="json", seed=0):
+    # a data folder main.py can be pointed at with KCALENDAR_HOME
+    # imported here, not at the top: run.py's worker imports this module
+    # before it times import main
+    import main
+    days = list(generate_history(years, seed=seed))
+    engine = main.open_storage(storage, directory)
+    engine.write_all(days)
+    engine.close()
+    settings = {"calorie_goal": 2000, "protein_goal": 120, "weight_goal": 80, "storage": storage}
+    with open(os.path.join(directory, "user_settings.json"), "w") as u:
+        json.dump(settings, u, indent=2)
+    return len(days)
@@ -0,0 +1,165 @@
+import argparse
+import collections
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.history import write_history
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn, repeat, setup=None):
+    # run fn repeat times (setup first, untimed) and summarise the seconds
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"runs": repeat, "mean": sum(times) / repeat, "min": min(times), "max": max(times)}
+
+
+# =========================
+# Worker (one history, fresh interpreter)
+# =========================
+# Runs with KCALENDAR_HOME set to the generated folder, so main.py reads and
+# writes there. Prompts are answered from a queue and output is dropped.
+
+def run_cases(repeat, seed):
+    results = {}
+
+    start = time.perf_counter()
+    import main
+    results["import_main"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    import app
+    results["import_app"] = time.perf_counter() - start
+
+    answers = collections.deque()
+    main.app_input = lambda prompt="": answers.popleft()
+    main.app_print = lambda *args: None
+
+    today = datetime.date.today()
+    start = time.perf_counter()
+    main.kcalendar.get(today.isoformat())
+    results["load_first_lookup"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    main.kcalendar.ensure(None, None)
+    results["load_all"] = time.perf_counter() - start
+
+    dates = main.kcalendar.dates()
+    results["days"] = len(dates)
+    rng = random.Random(seed)
+
+    def log_update():
+        date_str = rng.choice(dates)
+        answers.extend([date_str, "y", "450", "700", "800", "130", "na", "82.5"])
+        main.log_update()
+        # the app saves on the writer thread; time the write too
+        main.kcalendar.writer.flush()
+
+    def reset_today():
+        main.kcalendar[today.isoformat()] = {}
+
+    def update_today():
+        answers.extend(["450", "700", "800", "130", "na", "82.5"])
+        main.update_today()
+        main.kcalendar.writer.flush()
+
+    def view_week():
+        answers.extend([rng.choice(dates), "quit"])
+        main.view_week()
+
+    def view_month():
+        answers.append(rng.choice(dates)[:7].replace("-", " "))
+        main.view_month()
+
+    def ensure_day():
+        main.ensure_day(rng.choice(dates))
+
+    def week_start():
+        d = datetime.date.fromisoformat(rng.choice(dates))
+        return d - datetime.timedelta(days=d.weekday())
+
+    def month_of():
+        d = datetime.date.fromisoformat(rng.choice(dates))
+        return d.year, d.month
+
+    results["log_update"] = timed(log_update, repeat)
+    results["update_today"] = timed(update_today, repeat, setup=reset_today)
+    results["view_week"] = timed(view_week, repeat)
+    results["view_month"] = timed(view_month, repeat)
+    results["ensure_day"] = timed(ensure_day, repeat)
+    results["get_week_calories"] = timed(lambda: app.get_week_calories(week_start()), repeat)
+    results["get_week_meals_avg"] = timed(lambda: app.get_week_meals_avg(week_start()), repeat)
+    results["get_month_meals_avg"] = timed(lambda: app.get_month_meals_avg(*month_of()), repeat)
+
+    start = time.perf_counter()
+    main.kcalendar.close()
+    results["close"] = time.perf_counter() - start
+    return results
+
+
+def run_history(years, storage, repeat, seed):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        write_history(directory, years, storage, seed)
+        generate = time.perf_counter() - start
+
+        env = dict(os.environ, KCALENDAR_HOME=directory)
+        result_file = os.path.join(directory, "result.json")
+        subprocess.run(
+            [sys.executable, "-m", "bench.run", "--worker", result_file, "--repeat", str(repeat), "--seed", str(seed)],
+            cwd=ROOT, env=env, check=True,
+        )
+        with open(result_file) as f:
+            results = json.load(f)
+        results["generate"] = generate
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="time kcalendar against generated histories")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--storage", default="json", choices=["json", "sqlite", "binary", "sharded"])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        results = run_cases(args.repeat, args.seed)
+        with open(args.worker, "w") as f:
+            json.dump(results, f)
+        return
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "storage": args.storage,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "histories": {},
+    }
+    for years in args.years:
+        print(f"{years} year history ({args.storage})...")
+        report["histories"][str(years)] = run_history(years, args.storage, args.repeat, args.seed)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import datetime
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+# =========================
+# Columnar files (.kcol)
+# =========================
+# A small Parquet-like layout for exports. Rows are buffered into row groups
+# of ROW_GROUP_ROWS and each group is written column by column, every column
+# chunk zlib-compressed on its own, so memory stays at one row group and a
+# reader can decode just the columns it asks for.
+#
+#   MAGIC | chunks of group 0 | chunks of group 1 | ... | footer | uint32 | MAGIC
+#
+# The footer is JSON: the schema [[name, type], ...] and, per row group,
+# its row count and the (offset, size) of each column chunk. Column types:
+#   "date"   int32 day ordinals, read back as YYYY-MM-DD
+#   "int"    one validity byte per row (0 = None), then float64 values
+#   "float"  same as int, read back as float
+#   "bool"   one byte per row: 0 false, 1 true, 2 None
+# Numbers are little-endian.
+
+MAGIC = b"KCOL"
+ROW_GROUP_ROWS = 4096
+COLUMN_TYPES = ["date", "int", "float", "bool"]
+FOOTER_SIZE = struct.Struct("<I")
+
+
+def _little_endian(values):
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _encode(kind, values):
+    if kind == "date":
+        data = _little_endian(array("i", (datetime.date.fromisoformat(v).toordinal() for v in values))).tobytes()
+    elif kind == "bool":
+        data = bytes(2 if v is None else int(v) for v in values)
+    else:
+        valid = bytes(v is not None for v in values)
+        data = valid + _little_endian(array("d", (0.0 if v is None else v for v in values))).tobytes()
+    return zlib.compress(data)
+
+
+def _decode(kind, data, rows):
+    data = zlib.decompress(data)
+    if kind == "date":
+        ordinals = array("i")
+        ordinals.frombytes(data)
+        return [datetime.date.fromordinal(o).isoformat() for o in _little_endian(ordinals)]
+    if kind == "bool":
+        return [None if b == 2 else bool(b) for b in data]
+    valid = data[:rows]
+    values = array("d")
+    values.frombytes(data[rows:])
+    _little_endian(values)
+    if kind == "int":
+        return [int(v) if ok else None for v, ok in zip(values, valid)]
+    return [v if ok else None for v, ok in zip(values, valid)]
+
+
+def write_rows(path, schema, rows):
+    # rows is any iterable of {name: value} dicts, consumed one row group at
+    # a time; returns the number of rows written
+    for name, kind in schema:
+        if kind not in COLUMN_TYPES:
+            raise ValueError(f"unknown column type for {name}: {kind}")
+    footer = {"schema": schema, "row_groups": []}
+    total = 0
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+
+        def write_group(group):
+            chunks = []
+            for name, kind in schema:
+                data = _encode(kind, [row.get(name) for row in group])
+                chunks.append((f.tell(), len(data)))
+                f.write(data)
+            footer["row_groups"].append({"rows": len(group), "chunks": chunks})
+
+        group = []
+        for row in rows:
+            group.append(row)
+            if len(group) == ROW_GROUP_ROWS:
+                write_group(group)
+                total += len(group)
+                group = []
+        if group:
+            write_group(group)
+            total += len(group)
+
+        data = json.dumps(footer).encode()
+        f.write(data)
+        f.write(FOOTER_SIZE.pack(len(data)))
+        f.write(MAGIC)
+    return total
+
+
+def read_footer(f):
+    f.seek(-(FOOTER_SIZE.size + len(MAGIC)), 2)
+    size_bytes = f.read(FOOTER_SIZE.size)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a .kcol file")
+    size = FOOTER_SIZE.unpack(size_bytes)[0]
+    f.seek(-(FOOTER_SIZE.size + len(MAGIC) + size), 2)
+    return json.loads(f.read(size))
+
+
+def iter_rows(path, columns=None):
+    # {name: value} per row, a row group at a time; columns limits which
+    # columns are read and decoded (all of them by default)
+    with open(path, "rb") as f:
+        footer = read_footer(f)
+        schema = footer["schema"]
+        wanted = [i for i, (name, _) in enumerate(schema) if columns is None or name in columns]
+        for group in footer["row_groups"]:
+            decoded = []
+            for i in wanted:
+                offset, size = group["chunks"][i]
+                f.seek(offset)
+                decoded.append(_decode(schema[i][1], f.read(size), group["rows"]))
+            names = [schema[i][0] for i in wanted]
+            for values in zip(*decoded):
+                yield dict(zip(names, values))
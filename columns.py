@@ -0,0 +1,198 @@
+import datetime
+from array import array
+from itertools import compress
+
+
+def to_ordinal(date_str):
+    try:
+        return datetime.date.fromisoformat(date_str).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class ColumnSlice:
+    def __init__(self, start, present, values, valid):
+        # start is the ordinal of position 0 in every array below
+        self.start = start
+        self.present = present
+        self.values = values
+        self.valid = valid
+
+    def ordinals(self):
+        return compress(range(self.start, self.start + len(self.present)), self.present)
+
+    def logged(self, key):
+        # values of key on the days it was logged, in date order
+        return compress(self.values[key], self.valid[key])
+
+    def logged_with_ordinal(self, key):
+        return compress(zip(range(self.start, self.start + len(self.present)), self.values[key]), self.valid[key])
+
+
+# =========================
+# DayColumns
+# =========================
+# One float64 array per metric, indexed by day ordinal - base, plus one
+# validity byte per day and metric (1 = logged, 0 = None) and one "present"
+# byte per day (1 = the day has a log at all). A byte per flag instead of a
+# packed bit keeps slicing, bytes.count() and itertools.compress in C.
+# "calories" is the derived total_cal column, valid whenever the day exists.
+
+class DayColumns:
+    # grow by at least this many days at a time, so logging day by day
+    # does not copy every array on each new date
+    chunk = 366
+
+    def __init__(self, keys, meals, float_keys=()):
+        self.keys = list(keys)
+        self.meals = list(meals)
+        self.float_keys = set(float_keys)
+        self.stat_keys = ["calories"] + self.keys
+        self.base = None
+        self.count = 0
+        self.present = bytearray()
+        self.values = {key: array("d") for key in self.stat_keys}
+        self.valid = {key: bytearray() for key in self.stat_keys}
+        # called as watcher(ordinal) after every write, see RangeIndex
+        self.watchers = []
+
+    def copy(self):
+        # the same days in new arrays (no watchers), a few memcpys however
+        # long the history is
+        other = DayColumns(self.keys, self.meals, self.float_keys)
+        other.base = self.base
+        other.count = self.count
+        other.present = self.present[:]
+        other.values = {key: column[:] for key, column in self.values.items()}
+        other.valid = {key: column[:] for key, column in self.valid.items()}
+        return other
+
+    def nbytes(self):
+        total = len(self.present)
+        for key in self.stat_keys:
+            total += len(self.values[key]) * self.values[key].itemsize + len(self.valid[key])
+        return total
+
+    def _slot(self, ordinal):
+        if self.base is None:
+            return None
+        slot = ordinal - self.base
+        if 0 <= slot < len(self.present):
+            return slot
+        return None
+
+    def _grow_to(self, ordinal):
+        if self.base is None:
+            self.base = ordinal
+        if ordinal < self.base:
+            pad = max(self.base - ordinal, self.chunk)
+            self.base -= pad
+            self.present[:0] = bytes(pad)
+            for key in self.stat_keys:
+                column = array("d", bytes(8 * pad))
+                column.extend(self.values[key])
+                self.values[key] = column
+                self.valid[key][:0] = bytes(pad)
+        size = len(self.present)
+        if ordinal - self.base >= size:
+            pad = max(ordinal - self.base - size + 1, self.chunk)
+            self.present.extend(bytes(pad))
+            for key in self.stat_keys:
+                self.values[key].extend(array("d", bytes(8 * pad)))
+                self.valid[key].extend(bytes(pad))
+        return ordinal - self.base
+
+    def has(self, ordinal):
+        slot = self._slot(ordinal)
+        return slot is not None and self.present[slot] == 1
+
+    def _out(self, key, value):
+        if key not in self.float_keys and value.is_integer():
+            return int(value)
+        return value
+
+    def get(self, ordinal, key):
+        slot = self._slot(ordinal)
+        if slot is None or not self.valid[key][slot]:
+            return None
+        return self._out(key, self.values[key][slot])
+
+    def row(self, ordinal):
+        # every stat key for one day (None for unlogged), or None if no log
+        slot = self._slot(ordinal)
+        if slot is None or not self.present[slot]:
+            return None
+        return {
+            key: self._out(key, self.values[key][slot]) if self.valid[key][slot] else None
+            for key in self.stat_keys
+        }
+
+    def day(self, ordinal):
+        row = self.row(ordinal)
+        if row is None:
+            return None
+        del row["calories"]
+        return row
+
+    def _put(self, slot, key, value):
+        if value is None:
+            self.valid[key][slot] = 0
+            self.values[key][slot] = 0.0
+        else:
+            self.valid[key][slot] = 1
+            self.values[key][slot] = value
+
+    def _total(self, slot):
+        total = 0
+        for meal in self.meals:
+            if self.valid[meal][slot]:
+                total += self.values[meal][slot]
+        self.values["calories"][slot] = total
+        self.valid["calories"][slot] = 1
+
+    def set_day(self, ordinal, day):
+        slot = self._grow_to(ordinal)
+        if not self.present[slot]:
+            self.present[slot] = 1
+            self.count += 1
+        day = day or {}
+        for key in self.keys:
+            self._put(slot, key, day.get(key))
+        self._total(slot)
+        for watcher in self.watchers:
+            watcher(ordinal)
+
+    def set_value(self, ordinal, key, value):
+        slot = self._slot(ordinal)
+        self._put(slot, key, value)
+        if key in self.meals:
+            self._total(slot)
+        for watcher in self.watchers:
+            watcher(ordinal)
+
+    def bounds(self):
+        if self.count == 0:
+            return None
+        return self.base + self.present.index(1), self.base + self.present.rindex(1)
+
+    def _range(self, start, end):
+        # start and end are inclusive ordinals, None for open ends
+        if self.base is None:
+            return 0, 0
+        size = len(self.present)
+        lo = 0 if start is None else min(max(start - self.base, 0), size)
+        hi = size if end is None else min(max(end - self.base + 1, 0), size)
+        return lo, max(lo, hi)
+
+    def slice(self, start=None, end=None):
+        lo, hi = self._range(start, end)
+        return ColumnSlice(
+            (self.base or 0) + lo,
+            self.present[lo:hi],
+            {key: self.values[key][lo:hi] for key in self.stat_keys},
+            {key: self.valid[key][lo:hi] for key in self.stat_keys},
+        )
+
+    def ordinals(self, start=None, end=None):
+        lo, hi = self._range(start, end)
+        return compress(range((self.base or 0) + lo, (self.base or 0) + hi), self.present[lo:hi])
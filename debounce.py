@@ -0,0 +1,76 @@
+import sys
+import threading
+import time
+import traceback
+
+
+class DebouncedWriter:
+    # collects keys from mark() and calls write(keys) on its own thread once
+    # delay seconds pass without another mark(), so a burst of edits is one
+    # write; flush() writes whatever is pending right away, on the calling
+    # thread, after any write already running has finished
+    def __init__(self, write, delay):
+        self._write = write
+        self.delay = delay
+        self._cond = threading.Condition()
+        # dict as an ordered set, keys in the order first marked
+        self._pending = {}
+        self._deadline = 0.0
+        self._writing = False
+        self._thread = None
+
+    def mark(self, key):
+        with self._cond:
+            self._pending[key] = None
+            self._deadline = time.monotonic() + self.delay
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return list(self._pending)
+
+    def _write_pending(self):
+        # called holding _cond, which is let go while writing so mark()
+        # never waits on the disk
+        keys = list(self._pending)
+        self._pending.clear()
+        self._writing = True
+        self._cond.release()
+        try:
+            self._write(keys)
+        except BaseException:
+            # put them back for the next try
+            self._cond.acquire()
+            for key in keys:
+                self._pending.setdefault(key, None)
+            self._cond.release()
+            raise
+        finally:
+            self._cond.acquire()
+            self._writing = False
+            self._cond.notify_all()
+
+    def _run(self):
+        with self._cond:
+            while True:
+                while not self._pending or self._writing:
+                    self._cond.wait()
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                try:
+                    self._write_pending()
+                except Exception:
+                    traceback.print_exc(file=sys.stderr)
+                    self._deadline = time.monotonic() + self.delay
+
+    def flush(self):
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            if self._pending:
+                self._write_pending()
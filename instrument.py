@@ -0,0 +1,133 @@
+import contextlib
+import os
+import threading
+import time
+
+# =========================
+# Opt-in instrumentation
+# =========================
+# Off unless KCALENDAR_PROFILE is set or main.py / app.py get --profile.
+# The value is "1" for timings only, or a comma list adding "cprofile"
+# and/or "tracemalloc" for dumps next to the data files at quit, e.g.
+#   KCALENDAR_PROFILE=cprofile,tracemalloc python app.py
+#   python main.py --profile=cprofile
+# While off, timed() hands back one shared do-nothing context manager.
+
+enabled = False
+options = set()
+
+# name -> [calls, total seconds, max seconds, bytes written]
+_stats = {}
+_lock = threading.Lock()
+_null = contextlib.nullcontext()
+_profiler = None
+_reported = False
+
+
+def configure(spec):
+    global enabled, _profiler
+    if not spec or spec == "0":
+        return
+    enabled = True
+    options.update(part.strip().lower() for part in spec.split(",") if part.strip())
+    if "cprofile" in options and _profiler is None:
+        import cProfile
+        _profiler = cProfile.Profile()
+    if "tracemalloc" in options:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def configure_from_argv(argv):
+    # takes --profile / --profile=OPTIONS out of argv, returns the rest
+    rest = []
+    for arg in argv:
+        if arg == "--profile":
+            configure("1")
+        elif arg.startswith("--profile="):
+            configure(arg.split("=", 1)[1] or "1")
+        else:
+            rest.append(arg)
+    return rest
+
+
+def _record(name, seconds, nbytes):
+    with _lock:
+        entry = _stats.setdefault(name, [0, 0.0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        entry[3] += nbytes
+
+
+class _Timer:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self.start, 0)
+
+
+def timed(name):
+    if not enabled:
+        return _null
+    return _Timer(name)
+
+
+def add_bytes(name, nbytes):
+    if enabled:
+        with _lock:
+            _stats.setdefault(name, [0, 0.0, 0.0, 0])[3] += nbytes
+
+
+def run(fn):
+    # fn(), under cProfile when it was asked for; cProfile only sees the
+    # thread it runs on, so this wraps the command loop itself
+    if _profiler is None:
+        return fn()
+    return _profiler.runcall(fn)
+
+
+def summary():
+    with _lock:
+        rows = sorted(_stats.items(), key=lambda item: item[1][1], reverse=True)
+    lines = [f"{'name':<28}{'calls':>7}{'total ms':>11}{'mean ms':>10}{'max ms':>10}{'bytes':>12}"]
+    for name, (calls, total, longest, nbytes) in rows:
+        mean = total / calls if calls else 0.0
+        lines.append(f"{name[:27]:<28}{calls:>7}{total * 1000:>11.1f}{mean * 1000:>10.2f}{longest * 1000:>10.2f}{nbytes:>12}")
+    return lines
+
+
+def report(out, directory):
+    # print the summary with out (app_print) and write any dumps; only the
+    # first call does anything, so every quit path can call it
+    global _reported
+    if not enabled or _reported:
+        return
+    _reported = True
+    lines = summary()
+    out("______________ timings ______________")
+    for line in lines:
+        out(line)
+    # a windowed build has no console, so the table goes to a file too
+    path = os.path.join(directory, "kcalendar.timings.txt")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    out(f"timings written to {path}")
+    if _profiler is not None:
+        path = os.path.join(directory, "kcalendar.prof")
+        _profiler.dump_stats(path)
+        out(f"cProfile stats written to {path} (python -m pstats {path})")
+    if "tracemalloc" in options:
+        import tracemalloc
+        path = os.path.join(directory, "kcalendar.tracemalloc")
+        tracemalloc.take_snapshot().dump(path)
+        current, peak = tracemalloc.get_traced_memory()
+        out(f"memory: {current / 1e6:.1f} MB now, {peak / 1e6:.1f} MB peak; snapshot written to {path}")
+
+
+configure(os.environ.get("KCALENDAR_PROFILE"))
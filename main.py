@@ -1,45 +1,105 @@
+import atexit
+import collections
+import csv
 import json
 import os
 import sys
+import time
 import datetime
-MEALS = ["breakfast", "lunch", "dinner"]
-BURNT_KEY = "burnt"
-PROTEIN_KEY = "protein"
-WEIGHT_KEY = "weight"
-DAY_KEYS = MEALS + [BURNT_KEY, PROTEIN_KEY, WEIGHT_KEY]
+import calendar
+import shlex
+import threading
+import instrument
+import columnar
+from debounce import DebouncedWriter
+from storage import MEALS, BURNT_KEY, PROTEIN_KEY, WEIGHT_KEY, DAY_KEYS
+from storage import Calendar, JsonStorage, SqliteStorage, BinaryStorage, ShardedStorage
+from ranges import RangeIndex, moving_average, pad_slice, calorie_buckets
+from ranges import NO_LOG, LOGGED, WELL_UNDER, UNDER, OVER, WELL_OVER
 APP_RUNNING = True
+# True while main_loop is inside a command (at one of its prompts, say)
+COMMAND_RUNNING = False
 
 def app_path():
+    # KCALENDAR_HOME points the app at another data folder (bench/ uses it)
+    if os.environ.get("KCALENDAR_HOME"):
+        return os.environ["KCALENDAR_HOME"]
     if getattr(sys, 'frozen', False):
         return os.path.dirname(sys.executable)
     else:
         return os.path.dirname(os.path.abspath(__file__))
     
 BASE_DIR = app_path()
-DATA_FILE = os.path.join(BASE_DIR, "kcalendar.json")
-SETTINGS_FILE = os.path.join(BASE_DIR, "user_settings.json")
-
-if os.path.exists(DATA_FILE):
-    with open(DATA_FILE, "r") as f:
-        kcalendar = json.load(f)
-else:
-    kcalendar = {}
-
-
-def app_print(text):
-    print(text)
+# each profile has its own data and settings files: the default profile in
+# BASE_DIR, where they have always been, any other in profiles/<name>/
+PROFILES_DIR = os.path.join(BASE_DIR, "profiles")
+PROFILES_FILE = os.path.join(BASE_DIR, "kcalendar.profiles.json")
+DEFAULT_PROFILE = "default"
+
+def profile_dir(name):
+    if name == DEFAULT_PROFILE:
+        return BASE_DIR
+    return os.path.join(PROFILES_DIR, name)
+
+def load_profiles_file():
+    # which profile is open, and how much memory profiles that are not open
+    # may keep loaded (see Profiles below)
+    config = {}
+    if os.path.exists(PROFILES_FILE):
+        with open(PROFILES_FILE, "r") as p:
+            config = json.load(p)
+            if not isinstance(config, dict):
+                config = {}
+    config.setdefault("current", DEFAULT_PROFILE)
+    config.setdefault("memory_budget_mb", 64)
+    if not os.path.isdir(profile_dir(config["current"])):
+        config["current"] = DEFAULT_PROFILE
+    return config
+
+# the open profile, its folder and settings file; None until load_profile()
+# reads kcalendar.profiles.json, so importing this module reads no files
+profile_config = None
+PROFILE = None
+PROFILE_DIR = None
+SETTINGS_FILE = None
+profile_config_lock = threading.Lock()
+
+def load_profile():
+    # the open profile's name, reading the profiles file on first use
+    global profile_config, PROFILE, PROFILE_DIR, SETTINGS_FILE
+    with profile_config_lock:
+        if profile_config is None:
+            config = load_profiles_file()
+            PROFILE = config["current"]
+            PROFILE_DIR = profile_dir(PROFILE)
+            SETTINGS_FILE = os.path.join(PROFILE_DIR, "user_settings.json")
+            profile_config = config
+    return PROFILE
+
+STORAGE_ENGINES = ["json", "sqlite", "binary", "sharded"]
+
+# change notifications for a front end: day_listeners are called as
+# listener(date_str, old, new) on every day change (see Calendar.listeners),
+# settings_listeners as listener(settings) after the settings are saved.
+# profile_listeners are called as listener(name) after switching profile.
+# All are called on whichever thread made the change.
+day_listeners = []
+settings_listeners = []
+profile_listeners = []
+
+
+def app_print(*args):
+    print(*args)
 
 
 def app_input(prompt):
     return input(prompt)
 
 
-def handle_command(cmd: str):
-    pass
-
-
-
 def load_settings():
+    # a switch back to a profile may find its settings still on the writer
+    settings_writer.flush()
+    load_profile()
     if os.path.exists(SETTINGS_FILE):
         with open(SETTINGS_FILE, "r") as u:
             settings = json.load(u)
@@ -51,24 +111,341 @@ def load_settings():
     settings.setdefault("calorie_goal", None)
     settings.setdefault("protein_goal", None)
     settings.setdefault("weight_goal", None)
+    settings.setdefault("storage", "json")
+    # lines of scrollback the GUI console keeps, na (or 0) for all of them
+    settings.setdefault("console_max_lines", 2000)
 
     return settings
 
-def save_settings(settings):
-    with open(SETTINGS_FILE, "w") as u:
-        json.dump(settings, u, indent=2)
+# settings file path -> settings to write there, see save_settings()
+settings_to_write = {}
+
+def write_settings(paths):
+    for path in paths:
+        settings = settings_to_write.pop(path, None)
+        if settings is None:
+            continue
+        with instrument.timed("save settings"):
+            text = json.dumps(settings, indent=2)
+            tmp_file = path + ".tmp"
+            with open(tmp_file, "w") as u:
+                u.write(text)
+            os.replace(tmp_file, path)
+        instrument.add_bytes("save settings", len(text))
+
+settings_writer = DebouncedWriter(write_settings, Calendar.save_delay)
 
-user_settings = load_settings()
+def save_settings(settings):
+    # listeners hear about it now, the file is written in the background
+    # (a copy, so later edits don't race the writer thread)
+    load_profile()
+    settings_to_write[SETTINGS_FILE] = dict(settings)
+    settings_writer.mark(SETTINGS_FILE)
+    for listener in settings_listeners:
+        listener(settings)
+
+# loaded on first use, see get_settings() and preload()
+settings_lock = threading.Lock()
+loaded_settings = None
+
+def get_settings():
+    global loaded_settings
+    with settings_lock:
+        if loaded_settings is None:
+            loaded_settings = load_settings()
+        return loaded_settings
+
+def __getattr__(name):
+    # keeps backend.user_settings working for app.py without reading the
+    # settings file at import time
+    if name == "user_settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def open_storage(name, directory=None):
+    # directory is the current profile's folder unless given
+    directory = directory or profile_dir(load_profile())
+    if name == "sqlite":
+        return SqliteStorage(os.path.join(directory, "kcalendar.db"))
+    if name == "binary":
+        return BinaryStorage(os.path.join(directory, "kcalendar.bin"))
+    if name == "sharded":
+        return ShardedStorage(os.path.join(directory, "data"))
+    return JsonStorage(os.path.join(directory, "kcalendar.json"), os.path.join(directory, "kcalendar.journal"))
+
+def storage_for_path(path):
+    # picks the engine from the file extension: .json, .db or .bin; a
+    # directory (or a path with no extension) is a sharded store
+    ext = os.path.splitext(path)[1].lower()
+    if os.path.isdir(path) or ext == "":
+        return ShardedStorage(path)
+    if ext == ".db":
+        return SqliteStorage(path)
+    if ext == ".bin":
+        return BinaryStorage(path)
+    return JsonStorage(path, os.path.splitext(path)[0] + ".journal")
+
+def convert_file(source_path, target_path):
+    source = storage_for_path(source_path)
+    target = storage_for_path(target_path)
+    days = list(source.load())
+    target.write_all(days)
+    source.close()
+    target.close()
+    app_print(f"converted {len(days)} days from {source_path} to {target_path}.")
+
+def day_changed(date_str, old, new):
+    heatmap_cache.pop(int(date_str[:4]), None)
+    for listener in day_listeners:
+        listener(date_str, old, new)
+
+def open_calendar(open_engine):
+    cal = Calendar(open_engine)
+    cal.ranges = RangeIndex(cal)
+    # module level list, so listeners outlive a storage migration
+    cal.listeners.append(day_changed)
+    return cal
+
+def open_profile_calendar():
+    # the current profile's calendar; its folder is bound now, so it still
+    # opens the right files if it is first read after a profile switch. The
+    # one made at import, before load_profile(), finds it on first read,
+    # which is always while its profile is the open one.
+    directory = PROFILE_DIR
+    return open_calendar(lambda: open_storage(get_settings()["storage"], directory))
+
+kcalendar = open_profile_calendar()
+
+# days before today that preload() reads up front; older days are read the
+# first time something asks for them
+PRELOAD_DAYS = 90
+
+def range_stats(start, end, protein_goal=None):
+    # totals, counts and means for start..end (inclusive YYYY-MM-DD dates),
+    # plus first/last weight and, given a goal, protein goal hits
+    return kcalendar.ranges.stats(start, end, protein_goal)
+
+# day windows offered by view trend and drawn over the GUI bar chart
+TREND_WINDOWS = [7, 14, 30]
+# days view trend lists, ending at the chosen date
+TREND_DAYS = 28
+
+def moving_averages(key, window, start=None, end=None):
+    # [(date, average)] for each day from start to end (None for the first /
+    # last logged day), key being "calories" (total_cal) or a DAY_KEYS key;
+    # days before or after the history are listed too
+    if start is None or end is None:
+        kcalendar.ensure(None, None)
+        bounds = kcalendar.columns.bounds()
+        if bounds is None:
+            return []
+        start = start or datetime.date.fromordinal(bounds[0]).isoformat()
+        end = end or datetime.date.fromordinal(bounds[1]).isoformat()
+    first = datetime.date.fromisoformat(start)
+    lead_in = first - datetime.timedelta(days=window - 1)
+    column_slice = pad_slice(kcalendar.slice(lead_in.isoformat(), end), lead_in.toordinal(), datetime.date.fromisoformat(end).toordinal())
+    return [
+        (datetime.date.fromordinal(ordinal).isoformat(), avg)
+        for ordinal, avg in moving_average(column_slice, key, window)
+        if ordinal >= first.toordinal()
+    ]
+
+# year -> (calorie goal, one heatmap bucket per day from jan 1), dropped
+# when a day of that year changes
+heatmap_cache = {}
+
+def year_buckets(year):
+    goal = get_settings().get("calorie_goal")
+    with kcalendar.lock:
+        cached = heatmap_cache.get(year)
+        if cached is not None and cached[0] == goal:
+            return cached[1]
+        jan1 = datetime.date(year, 1, 1).toordinal()
+        size = datetime.date(year, 12, 31).toordinal() - jan1 + 1
+        column_slice = kcalendar.slice(f"{year:04d}-01-01", f"{year:04d}-12-31")
+        # the history may start or end part way through the year
+        lead = min(max(column_slice.start - jan1, 0), size)
+        buckets = bytearray(lead) + calorie_buckets(column_slice, goal)
+        buckets = buckets[:size] + bytearray(size - len(buckets[:size]))
+        heatmap_cache[year] = (goal, buckets)
+        return buckets
+
+def preload():
+    # read settings and recent history on a background thread, so a GUI can
+    # build its window while the data file is parsed
+    def run():
+        get_settings()
+        start = datetime.date.today() - datetime.timedelta(days=PRELOAD_DAYS)
+        kcalendar.preload(start.isoformat(), None).join()
+    threading.Thread(target=run, daemon=True).start()
 
 def ensure_day(date_str):
-    if date_str not in kcalendar or kcalendar[date_str] is None:
-        kcalendar[date_str] = {}
-    day = kcalendar[date_str]
-    for key in DAY_KEYS:
-        if key not in day:
-            day[key] = None
+    with kcalendar.lock:
+        day = kcalendar.get(date_str)
+        if day is None:
+            kcalendar[date_str] = {}
+            day = kcalendar[date_str]
+        for key in DAY_KEYS:
+            if key not in day:
+                day[key] = None
     return day
 
+def save_day(date_str, day=None):
+    # in memory now, on disk from the calendar's writer thread a moment later
+    kcalendar.save_later(date_str, day)
+
+def flush_saves(compact=True):
+    # everything still waiting on a writer thread, for every way out;
+    # compact also folds the journal into the data file, which one-shot
+    # commands and scripts leave to the engine's compact_at, for profiles
+    # switched away from too
+    if compact:
+        with profile_lock:
+            resident = [cal for cal, _, _ in resident_profiles.values()]
+        for cal in [kcalendar] + resident:
+            cal.flush()
+    else:
+        kcalendar.finish_saves()
+    settings_writer.flush()
+
+atexit.register(flush_saves, compact=False)
+
+def migrate_storage(target):
+    global kcalendar
+    user_settings = get_settings()
+    if target not in STORAGE_ENGINES:
+        raise ValueError(f"unknown storage engine: {target} (options: {', '.join(STORAGE_ENGINES)})")
+    if target == user_settings["storage"]:
+        app_print(f"already using {target} storage.")
+        return
+
+    days = kcalendar.plain_items()
+    engine = open_storage(target)
+    engine.write_all(days)
+    kcalendar.close()
+    kcalendar = open_calendar(lambda: engine)
+
+    user_settings["storage"] = target
+    save_settings(user_settings)
+    app_print(f"moved {len(days)} days to {target} storage.")
+
+def archive_year(year):
+    if not isinstance(kcalendar.engine, ShardedStorage):
+        raise ValueError("archiving needs sharded storage (python main.py migrate sharded)")
+    engine = kcalendar.engine
+    with engine.locked(), kcalendar.io_lock:
+        moved = engine.archive(year)
+    app_print(f"archived {moved} month files for {year}.")
+
+# =========================
+# Profiles
+# =========================
+# kcalendar, loaded_settings and heatmap_cache always belong to the open
+# profile; switching swaps them. Profiles switched away from stay loaded in
+# resident_profiles (least recently used first), so switching back is
+# instant, until their columns together pass memory_budget_mb; then the
+# oldest are closed. Only the open profile is read at startup.
+
+PROFILE_NAME_CHARS = set("abcdefghijklmnopqrstuvwxyz0123456789_-")
+
+# name -> (kcalendar, settings, heatmap_cache)
+resident_profiles = collections.OrderedDict()
+profile_lock = threading.RLock()
+
+def list_profiles():
+    names = [DEFAULT_PROFILE]
+    if os.path.isdir(PROFILES_DIR):
+        names += sorted(
+            name for name in os.listdir(PROFILES_DIR)
+            if name != DEFAULT_PROFILE and os.path.isdir(os.path.join(PROFILES_DIR, name))
+        )
+    return names
+
+def save_profiles_file():
+    profile_config["current"] = PROFILE
+    tmp_file = PROFILES_FILE + ".tmp"
+    with open(tmp_file, "w") as p:
+        json.dump(profile_config, p, indent=2)
+    os.replace(tmp_file, PROFILES_FILE)
+
+def profile_nbytes(cal, heatmap):
+    # only what is loaded, so a calendar never read costs nothing: its
+    # columns, the range totals kept over them and the heatmap's buckets
+    return cal.columns.nbytes() + cal.ranges.nbytes() + sum(len(buckets) for _, buckets in heatmap.values())
+
+def evict_profiles():
+    budget = profile_config["memory_budget_mb"] * 1_000_000
+    total = sum(profile_nbytes(cal, heatmap) for cal, _, heatmap in resident_profiles.values())
+    while resident_profiles and total > budget:
+        name, (cal, _, heatmap) = resident_profiles.popitem(last=False)
+        total -= profile_nbytes(cal, heatmap)
+        cal.close()
+
+def switch_profile(name):
+    global PROFILE, PROFILE_DIR, SETTINGS_FILE, kcalendar, loaded_settings, heatmap_cache
+    name = name.lower()
+    if not name or not set(name) <= PROFILE_NAME_CHARS:
+        raise ValueError("profile names use a-z, 0-9, _ and -")
+    load_profile()
+    with profile_lock:
+        if name == PROFILE:
+            return False
+        created = not os.path.isdir(profile_dir(name))
+        os.makedirs(profile_dir(name), exist_ok=True)
+        # the old profile's days still on its writer go to disk now, so a
+        # resident profile never has unsaved days; its journal is left for
+        # compact_at or quitting to fold in
+        kcalendar.finish_saves()
+        with settings_lock:
+            resident_profiles[PROFILE] = (kcalendar, loaded_settings, heatmap_cache)
+            PROFILE = name
+            PROFILE_DIR = profile_dir(name)
+            SETTINGS_FILE = os.path.join(PROFILE_DIR, "user_settings.json")
+            state = resident_profiles.pop(name, None)
+            if state is None:
+                loaded_settings = None
+                state = (None, None, {})
+            kcalendar, loaded_settings, heatmap_cache = state
+        if kcalendar is None:
+            kcalendar = open_profile_calendar()
+        evict_profiles()
+        save_profiles_file()
+    for listener in profile_listeners:
+        listener(name)
+    return created
+
+def set_profile_budget(megabytes):
+    # 0 keeps no profile but the open one loaded
+    if megabytes < 0:
+        raise ValueError("value must be 0 or more")
+    load_profile()
+    profile_config["memory_budget_mb"] = megabytes
+    with profile_lock:
+        evict_profiles()
+        save_profiles_file()
+
+def command_profile(args):
+    # profile: list them; profile NAME: switch (made if new); profile budget MB
+    load_profile()
+    if not args:
+        for name in list_profiles():
+            if name == PROFILE:
+                state = f"open, {profile_nbytes(kcalendar, heatmap_cache) / 1e6:.1f} MB"
+            elif name in resident_profiles:
+                cal, _, heatmap = resident_profiles[name]
+                state = f"loaded, {profile_nbytes(cal, heatmap) / 1e6:.1f} MB"
+            else:
+                state = "on disk"
+            app_print(f"{'*' if name == PROFILE else ' '} {name} ({state})")
+        app_print(f"profiles not open may keep {profile_config['memory_budget_mb']} MB loaded")
+    elif args[0].lower() == "budget":
+        set_profile_budget(int(args[1]))
+        app_print(f"profiles not open may keep {profile_config['memory_budget_mb']} MB loaded")
+    elif switch_profile(args[0]):
+        app_print(f"created and opened profile {PROFILE}")
+    else:
+        app_print(f"opened profile {PROFILE}")
+
 def setting_menu(user_settings):
     app_print("__________________________________________")
     app_print("entering settings (type 'back' to return)")
@@ -127,6 +504,8 @@ def set_protein_goal(user_settings):
         seperator()
         app_print(f"awesome! your protein goal is now set: {prgoal}")
 
+    return user_settings
+
 def set_weight_goal(user_settings):
     wgoal = weight_na("what is your current weight goal? ")
 
@@ -145,6 +524,8 @@ def set_weight_goal(user_settings):
         seperator()
         app_print(f"awesome! your weight goal is now set: {wgoal}")
 
+    return user_settings
+
 def seperator():
     app_print("__________________________________________")
     app_print("anything else you would like to do?")
@@ -180,46 +561,47 @@ def compare_weight_goal(value, user_settings):
     else:
         app_print(f"exactly on goal ({goal}).")
 
+# parse_na / parse_weight check one typed value, for the prompts below and
+# for one-line commands: None for blank or "na", "QUIT" for quit/stop, the
+# number otherwise, ValueError (with the message to show) if it is not one
+def parse_na(raw):
+    raw_nom = raw.lower().strip()
+    if raw_nom == "" or raw_nom == "na":
+        return None
+    elif raw_nom == "quit" or raw_nom == "stop":
+        return "QUIT"
+    try:
+        return int(raw_nom)
+    except ValueError:
+        raise ValueError("only enter a number value or na")
+
+def parse_weight(raw):
+    raw_nom = raw.lower().strip()
+    if raw_nom == "" or raw_nom == "na":
+        return None
+    elif raw_nom == "quit" or raw_nom == "stop":
+        return "QUIT"
+    try:
+        craw_nom = float(raw_nom)
+    except ValueError:
+        raise ValueError("only enter a number value or na")
+    if craw_nom == 0 or craw_nom < 0:
+        raise ValueError("value must be above 0")
+    return craw_nom
+
 def check_na(prompt):
     while True:
-        raw = app_input(prompt)
-        raw_nom = raw.lower().strip()
         try:
-        
-            if raw_nom == "" or raw_nom == "na":
-                val = None 
-                return val
-            elif raw_nom == "quit" or raw_nom == "stop":
-                val = "QUIT"
-                return val
-            else:
-                val = int(raw_nom)
-                return val
-        except ValueError:
-            app_print("only enter a number value or na")
-            continue
+            return parse_na(app_input(prompt))
+        except ValueError as e:
+            app_print(str(e))
 
 def weight_na(prompt):
     while True:
-        raw = app_input(prompt)
-        raw_nom = raw.lower().strip()
         try:
-        
-            if raw_nom == "" or raw_nom == "na":
-                val = None 
-                return val
-            elif raw_nom == "quit" or raw_nom == "stop":
-                val = "QUIT"
-                return val
-            craw_nom = float(raw_nom)
-            if craw_nom == 0 or craw_nom < 0:
-                app_print("value must be above 0")
-                continue
-            else:
-                return craw_nom
-        except ValueError:
-            app_print("only enter a number value or na")
-            continue
+            return parse_weight(app_input(prompt))
+        except ValueError as e:
+            app_print(str(e))
 
 def goal_hit(protein, protein_goal):
 
@@ -275,10 +657,7 @@ def log_update():
                     "protein":pro_val,
                      "burnt":burn_val,
                      "weight":weight_val}
-    kcalendar[date] = day_data
-    print(kcalendar)
-    with open(DATA_FILE, "w") as f:
-        json.dump(kcalendar, f, indent=2, sort_keys=True)
+    save_day(date, day_data)
 
 def update_today():
     today = datetime.date.today().isoformat()
@@ -313,8 +692,7 @@ def update_today():
             day["weight"] = wval
 
 
-    with open(DATA_FILE, "w") as f:
-        json.dump(kcalendar, f, indent=2, sort_keys=True)
+    save_day(today)
 
     tcal = total_cal(day)
     app_print("____________________________")
@@ -328,6 +706,51 @@ def update_today():
     if day.get(WEIGHT_KEY) is not None:
         app_print(f"current weight: {day.get(WEIGHT_KEY)}kg")
 
+def report_day(date):
+    # the day view for a logged date
+    user_settings = get_settings()
+    day = ensure_day(date)
+    protein_goal = user_settings.get("protein_goal")
+    protein = day.get("protein")
+    tcal = total_cal(day)
+    weight_goal = user_settings.get("weight_goal")
+    weight = day.get("weight")
+    app_print("__________________________________")
+    app_print(date)
+    app_print (f"total calories: {tcal}")
+    compare_to_goal(tcal, user_settings)
+    
+    hit = goal_hit(protein, protein_goal)
+    if protein_goal is None:
+        app_print("enter a protein goal to see if you are getting enough protein")
+    if protein_goal is not None:
+        if hit == True:
+            app_print(f"you hit your protein goal of {protein_goal}g: {protein}g")
+            app_print(f"that's", protein-protein_goal,"grams over goal")
+        elif hit is None:
+            app_print("no protein was logged for this day")
+        else:
+            app_print(f"you did not hit your protein goal of {protein_goal}g: {protein}g")
+            app_print(f"that's", protein-protein_goal,"under goal")
+                
+    burnt = day.get(BURNT_KEY)
+    if burnt is not None:
+        app_print(f"burnt calories: {burnt}")
+
+    if weight is not None:
+        app_print(f"weight for this day: {weight}kg")
+        if weight_goal is not None:
+            weight_dif = weight - weight_goal
+            if weight_dif > 0:
+                app_print(f"you have {weight_dif:.1f}kg to lose")
+            elif weight_dif < 0:
+                app_print(f"you have {abs(weight_dif):.1f}kg to gain")
+            else:
+                app_print("you are perfectly on your weight goal!")
+
+    else:
+        app_print("no weight logged this day")
+
 def view_day():
     app_print("________________________________________")
     app_print("entering viewing mode, to exit type quit")
@@ -345,63 +768,78 @@ def view_day():
             app_print("__________________________________")
             app_print("there is no log for this day")
             continue
-        
 
-        elif date in kcalendar:
-            day = ensure_day(date)
-            protein_goal = user_settings.get("protein_goal")
-            protein = day.get("protein")
-            tcal = total_cal(day)
-            weight_goal = user_settings.get("weight_goal")
-            weight = day.get("weight")
-            app_print("__________________________________")
-            app_print(date)
-            app_print (f"total calories: {tcal}")
-            compare_to_goal(tcal, user_settings)
-            
-            hit = goal_hit(protein, protein_goal)
-            if protein_goal is None:
-                app_print("enter a protein goal to see if you are getting enough protein")
-            if protein_goal is not None:
-                if hit == True:
-                    app_print(f"you hit your protein goal of {protein_goal}g: {protein}g")
-                    app_print(f"that's", protein-protein_goal,"grams over goal")
-                elif hit is None:
-                    app_print("no protein was logged for this day")
-                else:
-                    app_print(f"you did not hit your protein goal of {protein_goal}g: {protein}g")
-                    app_print(f"that's", protein-protein_goal,"under goal")
-                        
-            burnt = day.get(BURNT_KEY)
-            if burnt is not None:
-                app_print(f"burnt calories: {burnt}")
-
-            if weight is not None:
-                app_print(f"weight for this day: {weight}kg")
-                if weight_goal is not None:
-                    weight_dif = weight - weight_goal
-                    if weight_dif > 0:
-                        app_print(f"you have {weight_dif:.1f}kg to lose")
-                    elif weight_dif < 0:
-                        app_print(f"you have {abs(weight_dif):.1f}kg to gain")
-                    else:
-                        app_print("you are perfectly on your weight goal!")
+        report_day(date)
+        app_print("__________________________________________________________")
+        app_print("would you like to view another day? type quit to leave")
 
-            else:
-                app_print("no weight logged this day")
-            
-            app_print("__________________________________________________________")
-            app_print("would you like to view another day? type quit to leave")
-            
-            
+def report_week(date_start):
+    # every day from a logged date_start on, then the 7-day summary
+    user_settings = get_settings()
+    protein_goal = user_settings.get("protein_goal")
+    weight_goal = user_settings.get("weight_goal")
+    start_cal = datetime.date.fromisoformat(date_start)
+    
+    for i in range(7):
+        current_date = start_cal + datetime.timedelta(days=i)
+        date_str = current_date.isoformat()
+        day = kcalendar.get(date_str)
+        
+        if day is None:
+            app_print("__________________________________")
+            app_print(f"no log for {date_str}")
             continue
+        else:
+            day = ensure_day(date_str)
+        
+        protein = day.get("protein")
+        weight = day.get("weight")
+
+        tcal = total_cal(day)
+        app_print("__________________________________")
+        app_print(date_str)
+        app_print(f"total calories: {tcal}")
+        if protein is not None:
+            app_print(f"protein: {protein}g")
+        burnt = day.get(BURNT_KEY)
+        if burnt is not None:
+            app_print(f"burnt calories: {burnt}")
+        if weight is not None:
+            app_print(f"weight: {weight}kg")
+        if weight is not None and weight_goal is not None:
+            compare_weight_goal(weight, user_settings)
+            
+    end_cal = start_cal + datetime.timedelta(days=6)
+    stats = range_stats(date_start, end_cal.isoformat(), protein_goal)
+    calorie_avg = stats.sums["calories"] / stats.days
+    app_print("_______________________________________________")
+    app_print(f"average calories for days logged: {calorie_avg:.1f}")
+    compare_to_goal(calorie_avg, user_settings)
+    protein_logged = stats.counts[PROTEIN_KEY]
+    if protein_goal is not None and protein_logged > 0:
+        protein_avg = stats.mean(PROTEIN_KEY)
+        app_print(f"you hit your protein goal for {stats.protein_hits}/{protein_logged} logged days")
+        app_print(f"average protein logged was {protein_avg:.1f}g")
+    elif protein_goal is not None and protein_logged == 0:
+        app_print("you didn't log any protein this week")
+    else:
+        app_print("set a protein goal to see if you are eating enough protein")
+    start_weight = stats.first_weight
+    finish_weight = stats.last_weight
+    if start_weight is not None and finish_weight is not None:
+        dif_weight = start_weight-finish_weight
+        app_print(f"started at {start_weight}kg, finished at {finish_weight}kg")
+        if dif_weight >0:
+            app_print(f"you lost {abs(dif_weight):.1f}kg")
+        elif dif_weight <0:
+            app_print(f"you gained {abs(dif_weight):.1f}kg")
+        else:
+            app_print("your weight did not change this week")
 
 def view_week():
     app_print("__________________________________________")
     app_print("entering viewing mode, to exit type quit")
     app_print("what day do you want to start at?")
-    protein_goal = user_settings.get("protein_goal")
-    weight_goal = user_settings.get("weight_goal")
     
     while True:
         
@@ -414,157 +852,43 @@ def view_week():
             app_print("there is no log for this day")
             continue
 
-        elif date_start in kcalendar:
-            start_weight = None
-            finish_weight = None
-            protein_logged = 0
-            protein_hit = 0
-            start_cal = datetime.date.fromisoformat(date_start)
-            tcal_list = []
-            protein_list = []
-            
-            for i in range(7):
-                current_date = start_cal + datetime.timedelta(days=i)
-                date_str = current_date.isoformat()
-                day = kcalendar.get(date_str)
-                
-                if day is None:
-                    app_print("__________________________________")
-                    app_print(f"no log for {date_str}")
-                    continue
-                else:
-                    day = ensure_day(date_str)
-                
-                protein = day.get("protein")
-                if protein_goal is not None and protein is not None:
-                    protein_logged += 1
-                    protein_list.append(protein)
-                    if protein >= protein_goal:
-                        protein_hit += 1
-                
-                weight = day.get("weight")
-
-                if start_weight is None and weight is not None:
-                    start_weight = weight
-                if weight is not None:
-                    finish_weight = weight
-                
+        report_week(date_start)
+        app_print("_______________________________________________")
+        app_print("want to check another week? type quit to leave")
 
-                tcal = total_cal(day)
-                tcal_list.append(tcal)
-                app_print("__________________________________")
-                app_print(date_str)
-                app_print(f"total calories: {tcal}")
-                if protein is not None:
-                    app_print(f"protein: {protein}g")
-                burnt = day.get(BURNT_KEY)
-                if burnt is not None:
-                    app_print(f"burnt calories: {burnt}")
-                if weight is not None:
-                    app_print(f"weight: {weight}kg")
-                if weight is not None and weight_goal is not None:
-                    compare_weight_goal(weight, user_settings)
-                    
-            calorie_avg = sum(tcal_list)/len(tcal_list)
-            app_print("_______________________________________________")
-            app_print(f"average calories for days logged: {calorie_avg:.1f}")
-            compare_to_goal(calorie_avg, user_settings)
-            if protein_goal is not None and len(protein_list) > 0:
-                protein_avg = sum(protein_list)/len(protein_list)
-                app_print(f"you hit your protein goal for {protein_hit}/{protein_logged} logged days")
-                app_print(f"average protein logged was {protein_avg:.1f}g")
-            elif protein_goal is not None and len(protein_list) == 0:
-                app_print("you didn't log any protein this week")
-            else:
-                app_print("set a protein goal to see if you are eating enough protein")
-            if start_weight is not None and finish_weight is not None:
-                dif_weight = start_weight-finish_weight
-                app_print(f"started at {start_weight}kg, finished at {finish_weight}kg")
-                if dif_weight >0:
-                    app_print(f"you lost {abs(dif_weight):.1f}kg")
-                elif dif_weight <0:
-                    app_print(f"you gained {abs(dif_weight):.1f}kg")
-                else:
-                    app_print("your weight did not change this week")
-            app_print("_______________________________________________")
-            app_print("want to check another week? type quit to leave")
-            continue
-
-def view_month():
-    month_key = app_input("what month would you like to view (YYYY MM): ").strip().replace(" ", "-")
-
-    weekly_totals = {1: [], 2: [], 3: [], 4: [], 5: []}
-    week_start_weight = {1: None, 2: None, 3: None, 4: None, 5: None}
-    week_finish_weight = {1: None, 2: None, 3: None, 4: None, 5: None}
-
-    month_total = []
+def report_month(year, month):
+    last_day = calendar.monthrange(year, month)[1]
+    ym = f"{year:04d}-{month:02d}"
 
+    user_settings = get_settings()
     protein_goal = user_settings.get("protein_goal")
-    protein_list = []
-    protein_logged = 0
-    protein_hit = 0
-
     weight_goal = user_settings.get("weight_goal")
 
-
-    month_start_weight = None
-    month_finish_weight = None
-
     app_print("____________________________________")
 
 
-    for date_str in sorted(kcalendar):
-        if not date_str.startswith(month_key):
-            continue
-
-        dt = datetime.date.fromisoformat(date_str)
-        day_num = dt.day
-        week_num = (day_num - 1) // 7 + 1
-
-        daydict = ensure_day(date_str)
-
-
-        tcal = total_cal(daydict)
-        weekly_totals[week_num].append(tcal)
-        month_total.append(tcal)
-
-
-        protein = daydict.get("protein")
-        if protein_goal is not None and protein is not None:
-            protein_logged += 1
-            protein_list.append(protein)
-            if protein >= protein_goal:
-                protein_hit += 1
-
-
-        weight = daydict.get("weight")
-        if weight is not None:
-
-            if month_start_weight is None:
-                month_start_weight = weight
-            month_finish_weight = weight
-
-
-            if week_start_weight[week_num] is None:
-                week_start_weight[week_num] = weight
-            week_finish_weight[week_num] = weight
-
-
     for week in range(1, 6):
-        totals = weekly_totals[week]
+        # days 1-7, 8-14, ... cut off at the end of the month
+        first = (week - 1) * 7 + 1
+        last = min(first + 6, last_day)
+        if first > last:
+            # february has no 5th week
+            stats = None
+        else:
+            stats = range_stats(f"{ym}-{first:02d}", f"{ym}-{last:02d}")
 
         app_print("___________________________________________")
         app_print(f"week {week}")
 
-        if not totals:
+        if stats is None or stats.days == 0:
             app_print("no data received for this week")
             app_print("___________________________________________")
             continue
 
-        week_avg = sum(totals) / len(totals)
+        week_avg = stats.sums["calories"] / stats.days
 
 
-        app_print(f"days logged: {len(totals)}")
+        app_print(f"days logged: {stats.days}")
 
 
         app_print(f"week {week} average calories: {week_avg:.1f}")
@@ -573,8 +897,8 @@ def view_month():
         compare_to_goal(week_avg, user_settings)
 
 
-        sw = week_start_weight[week]
-        fw = week_finish_weight[week]
+        sw = stats.first_weight
+        fw = stats.last_weight
         if sw is None or fw is None:
             app_print("weight change: not enough weight logs this week")
         else:
@@ -596,18 +920,21 @@ def view_month():
 
     
     app_print("===========================================")
-    app_print(f"month summary: {month_key}")
+    app_print(f"month summary: {ym}")
 
-    if not month_total:
+    stats = range_stats(f"{ym}-01", f"{ym}-{last_day:02d}", protein_goal)
+    if stats.days == 0:
         app_print("no data received for this month")
         app_print("===========================================")
         return
 
-    month_avg = sum(month_total) / len(month_total)
+    month_avg = stats.sums["calories"] / stats.days
     app_print(f"average calories for this month: {month_avg:.1f}")
     compare_to_goal(month_avg, user_settings)
 
     
+    month_start_weight = stats.first_weight
+    month_finish_weight = stats.last_weight
     if month_start_weight is not None and month_finish_weight is not None:
         change = month_finish_weight - month_start_weight
         if change > 0:
@@ -624,8 +951,10 @@ def view_month():
         app_print("month weight change: no weight logged this month")
 
 
+    protein_logged = stats.counts[PROTEIN_KEY]
     if protein_goal is not None and protein_logged > 0:
-        protein_avg = sum(protein_list) / len(protein_list)
+        protein_avg = stats.mean(PROTEIN_KEY)
+        protein_hit = stats.protein_hits
         app_print(f"protein goal hit: {protein_hit}/{protein_logged} logged days")
         app_print(f"average protein logged: {protein_avg:.1f}g")
     elif protein_goal is not None and protein_logged == 0:
@@ -635,29 +964,579 @@ def view_month():
 
     app_print("===========================================")
 
+def view_month():
+    month_key = app_input("what month would you like to view (YYYY MM): ").strip().replace(" ", "-")
+    try:
+        month_start = datetime.date.fromisoformat(month_key + "-01")
+    except ValueError:
+        app_print("please enter the month as YYYY MM")
+        return
+    report_month(month_start.year, month_start.month)
+
+def report_trend(window, end):
+    # window-day averages for the TREND_DAYS days up to end (a date)
+    user_settings = get_settings()
+    start = end - datetime.timedelta(days=TREND_DAYS - 1)
+
+    calories = moving_averages("calories", window, start.isoformat(), end.isoformat())
+    proteins = moving_averages(PROTEIN_KEY, window, start.isoformat(), end.isoformat())
+    weights = moving_averages(WEIGHT_KEY, window, start.isoformat(), end.isoformat())
+
+    app_print("__________________________________")
+    app_print(f"{window}-day averages, {start.isoformat()} to {end.isoformat()}")
+    for (date_str, cal), (_, protein), (_, weight) in zip(calories, proteins, weights):
+        if cal is None:
+            app_print(f"{date_str}  no logs in the last {window} days")
+            continue
+        line = f"{date_str}  calories {cal:.1f}"
+        if protein is not None:
+            line += f"  protein {protein:.1f}g"
+        if weight is not None:
+            line += f"  weight {weight:.1f}kg"
+        app_print(line)
+
+    logged = [(cal, weight) for (_, cal), (_, weight) in zip(calories, weights) if cal is not None]
+    if logged:
+        app_print("__________________________________")
+        app_print(f"latest {window}-day calorie average: {logged[-1][0]:.1f}")
+        compare_to_goal(logged[-1][0], user_settings)
+        trend = [weight for _, weight in logged if weight is not None]
+        if len(trend) >= 2:
+            change = trend[-1] - trend[0]
+            if change > 0:
+                app_print(f"weight trend: up {change:.1f}kg ({trend[0]:.1f}kg → {trend[-1]:.1f}kg)")
+            elif change < 0:
+                app_print(f"weight trend: down {abs(change):.1f}kg ({trend[0]:.1f}kg → {trend[-1]:.1f}kg)")
+            else:
+                app_print(f"weight trend: flat at {trend[-1]:.1f}kg")
+
+def view_trend():
+    app_print("________________________________________")
+    app_print("entering trend mode, to exit type quit")
+    app_print("________________________________________")
+
+    while True:
+        window = app_input(f"how many days to average over? ({', '.join(str(w) for w in TREND_WINDOWS)}): ").strip().lower()
+        if window in ["quit", "stop", "back"]:
+            app_print("exiting")
+            break
+        if not window.isdigit() or int(window) not in TREND_WINDOWS:
+            app_print(f"please enter one of {', '.join(str(w) for w in TREND_WINDOWS)}")
+            continue
+        window = int(window)
 
+        date = app_input("up to what date? (blank for today): ").strip().replace(" ", "-")
+        if date in ["quit", "stop", "back"]:
+            app_print("exiting")
+            break
+        try:
+            end = datetime.date.fromisoformat(date) if date else datetime.date.today()
+        except ValueError:
+            app_print("please enter the date as YYYY MM DD")
+            continue
 
-def main_loop():
+        report_trend(window, end)
+        app_print("__________________________________________________________")
+        app_print("would you like to view another trend? type quit to leave")
+
+# one character per heatmap bucket for view year
+YEAR_MARKS = {NO_LOG: " ", LOGGED: "o", WELL_UNDER: ".", UNDER: "-", OVER: "+", WELL_OVER: "#"}
+
+def parse_years(text):
+    # "YYYY" or "YYYY YYYY" -> (first, last), ValueError otherwise
+    years = text.split()
+    if not 1 <= len(years) <= 2:
+        raise ValueError(text)
+    first_year = int(years[0])
+    last_year = int(years[-1])
+    if not 1 <= first_year <= last_year <= 9999:
+        raise ValueError(text)
+    return first_year, last_year
+
+def report_year(first_year, last_year):
+    user_settings = get_settings()
+    goal = user_settings.get("calorie_goal")
+
+    for year in range(first_year, last_year + 1):
+        buckets = year_buckets(year)
+        jan1 = datetime.date(year, 1, 1).toordinal()
+
+        app_print("===========================================")
+        app_print(f"year {year}")
+        app_print("     " + "".join(str(d % 10) for d in range(1, 32)))
+        for month in range(1, 13):
+            first = datetime.date(year, month, 1).toordinal() - jan1
+            last = first + calendar.monthrange(year, month)[1]
+            row = "".join(YEAR_MARKS[b] for b in buckets[first:last])
+            app_print(f"{calendar.month_abbr[month].lower()}  {row}")
+
+        stats = range_stats(f"{year:04d}-01-01", f"{year:04d}-12-31")
+        if stats.days == 0:
+            app_print("no data received for this year")
+            continue
+        app_print(f"days logged: {stats.days}")
+        year_avg = stats.sums["calories"] / stats.days
+        app_print(f"average calories for this year: {year_avg:.1f}")
+        compare_to_goal(year_avg, user_settings)
+        if goal:
+            under = buckets.count(WELL_UNDER) + buckets.count(UNDER)
+            app_print(f"days at or under goal: {under}/{stats.days}")
+
+    if goal:
+        app_print("'.' under 90% of goal, '-' up to goal, '+' up to 10% over, '#' more than 10% over")
+    else:
+        app_print("'o' logged day (set a calorie goal to colour days against it)")
+    app_print("===========================================")
+
+def view_year():
+    try:
+        first_year, last_year = parse_years(app_input("what year(s) would you like to view (YYYY, or YYYY YYYY for a range): "))
+    except ValueError:
+        app_print("please enter the year as YYYY, or two years as YYYY YYYY")
+        return
+    report_year(first_year, last_year)
+
+
+# =========================
+# One-line commands
+# =========================
+# handle_command() runs one line such as
+#   log 2026-01-30 b=550 l=350 d=1000 p=105 burnt=350 w=95.4
+#   view month 2026-01 --json
+# from main_loop, the command line (python main.py <command>) or a file of
+# commands (run FILE). A bare "log", "view month", ... falls back to the
+# prompts. Returns False once the app should stop, COMMAND_FAILED when the
+# command could not run (a one-shot command then exits 1), True otherwise.
+
+# truthy, so an interactive session carries on after a failed command
+COMMAND_FAILED = "failed"
+
+# field names for log / update, short and long
+LOG_FIELDS = {"b": "breakfast", "l": "lunch", "d": "dinner", "p": PROTEIN_KEY, "w": WEIGHT_KEY, "burn": BURNT_KEY}
+LOG_FIELDS.update({key: key for key in DAY_KEYS})
+
+SETTING_FIELDS = {
+    "calorie_goal": "calorie_goal", "calorie": "calorie_goal",
+    "protein_goal": "protein_goal", "protein": "protein_goal",
+    "weight_goal": "weight_goal", "weight": "weight_goal",
+    "console_max_lines": "console_max_lines", "console": "console_max_lines",
+}
+
+COMMAND_HELP = [
+    "log DATE b= l= d= p= burnt= w=      log (or overwrite) a day, na for none",
+    "update [DATE] FIELD=VALUE ...       change some fields (today by default)",
+    "view day DATE [--json]",
+    "view week DATE [--json]",
+    "view month YYYY-MM [--json]",
+    "view year YYYY [YYYY] [--json]",
+    f"view trend {'|'.join(str(w) for w in TREND_WINDOWS)} [DATE] [--json]",
+    "settings calorie_goal= protein_goal= weight_goal= console_max_lines=",
+    "import FILE [fill|skip|overwrite]   read days from a .csv or .jsonl file",
+    "export FILE [START [END]]           write days to a .csv, .jsonl or .kcol file",
+    "profile [NAME]                      list profiles, or open (or make) one",
+    "profile budget MB                   memory for profiles kept loaded",
+    "migrate ENGINE | convert SRC DST | archive YEAR",
+    "run FILE                            run every command in FILE",
+    "log, update, view, settings on their own ask step by step",
+]
+
+def parse_fields(args, fields):
+    # ["b=550", "w=na", ...] -> {"breakfast": 550, "weight": None, ...}
+    values = {}
+    for arg in args:
+        name, sep, raw = arg.partition("=")
+        key = fields.get(name.lower())
+        if not sep or key is None:
+            raise ValueError(f"unknown field: {arg}")
+        parse = parse_weight if key in [WEIGHT_KEY, "weight_goal"] else parse_na
+        value = parse(raw)
+        if value == "QUIT":
+            raise ValueError(f"{name}: only enter a number value or na")
+        values[key] = value
+    return values
+
+def parse_date(text):
+    return datetime.date.fromisoformat(text.replace(" ", "-")).isoformat()
+
+def print_json(value):
+    app_print(json.dumps(value))
+
+def range_json(start, end):
+    stats = range_stats(start, end, get_settings().get("protein_goal"))
+    return {
+        "start": start,
+        "end": end,
+        "days": stats.days,
+        "totals": {
+            key: {"sum": stats.sums[key], "count": stats.counts[key], "mean": stats.mean(key)}
+            for key in ["calories"] + DAY_KEYS if key != WEIGHT_KEY
+        },
+        "first_weight": stats.first_weight,
+        "last_weight": stats.last_weight,
+        "protein_hits": stats.protein_hits,
+    }
+
+def day_json(date_str):
+    day = kcalendar.get(date_str)
+    if day is None:
+        return {"date": date_str, "logged": False}
+    return {"date": date_str, "logged": True, **{key: day.get(key) for key in DAY_KEYS}, "total_cal": total_cal(day)}
+
+def week_json(date_start):
+    start = datetime.date.fromisoformat(date_start)
+    end = start + datetime.timedelta(days=6)
+    week = range_json(start.isoformat(), end.isoformat())
+    week["logs"] = [day_json((start + datetime.timedelta(days=i)).isoformat()) for i in range(7)]
+    return week
+
+def month_json(year, month):
+    last_day = calendar.monthrange(year, month)[1]
+    ym = f"{year:04d}-{month:02d}"
+    report = range_json(f"{ym}-01", f"{ym}-{last_day:02d}")
+    report["weeks"] = [
+        range_json(f"{ym}-{first:02d}", f"{ym}-{min(first + 6, last_day):02d}")
+        for first in range(1, last_day + 1, 7)
+    ]
+    return report
+
+def year_json(first_year, last_year):
+    years = []
+    for year in range(first_year, last_year + 1):
+        report = range_json(f"{year:04d}-01-01", f"{year:04d}-12-31")
+        report["months"] = [
+            range_json(f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-{calendar.monthrange(year, month)[1]:02d}")
+            for month in range(1, 13)
+        ]
+        years.append(report)
+    return years
+
+def trend_json(window, end):
+    if window not in TREND_WINDOWS:
+        raise ValueError(f"window must be one of {', '.join(str(w) for w in TREND_WINDOWS)}")
+    start = (end - datetime.timedelta(days=TREND_DAYS - 1)).isoformat()
+    series = [moving_averages(key, window, start, end.isoformat()) for key in ["calories", PROTEIN_KEY, WEIGHT_KEY]]
+    return {
+        "window": window,
+        "averages": [
+            {"date": date_str, "calories": cal, "protein": protein, "weight": weight}
+            for (date_str, cal), (_, protein), (_, weight) in zip(*series)
+        ],
+    }
+
+def set_day_values(date_str, values, replace):
+    # replace: the day becomes values (missing keys None), like log;
+    # otherwise only the given keys change, like update. Not saved.
+    if replace:
+        kcalendar[date_str] = {key: values.get(key) for key in DAY_KEYS}
+        return kcalendar[date_str]
+    day = ensure_day(date_str)
+    for key, value in values.items():
+        day[key] = value
+    return day
+
+def command_log(args, replace):
+    if replace or (args and "=" not in args[0]):
+        date_str = parse_date(args[0])
+        args = args[1:]
+    else:
+        date_str = datetime.date.today().isoformat()
+    day = set_day_values(date_str, parse_fields(args, LOG_FIELDS), replace)
+    save_day(date_str)
+    app_print(f"saved {date_str}: total calories {total_cal(day)}")
+
+def command_view(args):
+    as_json = "--json" in args
+    args = [arg for arg in args if arg != "--json"]
+    length, args = args[0].lower(), args[1:]
+
+    if length == "day":
+        date_str = parse_date(args[0])
+        if as_json:
+            print_json(day_json(date_str))
+        elif date_str not in kcalendar:
+            app_print("there is no log for this day")
+        else:
+            report_day(date_str)
+
+    elif length == "week":
+        date_start = parse_date(args[0])
+        if as_json:
+            print_json(week_json(date_start))
+        elif date_start not in kcalendar:
+            app_print("there is no log for this day")
+        else:
+            report_week(date_start)
+
+    elif length == "month":
+        # YYYY-MM or YYYY MM, like view_month
+        month_start = datetime.date.fromisoformat("-".join(args) + "-01")
+        year, month = month_start.year, month_start.month
+        if as_json:
+            print_json(month_json(year, month))
+        else:
+            report_month(year, month)
+
+    elif length == "year":
+        first_year, last_year = parse_years(" ".join(args))
+        if as_json:
+            print_json(year_json(first_year, last_year))
+        else:
+            report_year(first_year, last_year)
+
+    elif length == "trend":
+        window = int(args[0])
+        end = datetime.date.fromisoformat(parse_date(args[1])) if len(args) > 1 else datetime.date.today()
+        if as_json:
+            print_json(trend_json(window, end))
+        elif window not in TREND_WINDOWS:
+            raise ValueError(f"window must be one of {', '.join(str(w) for w in TREND_WINDOWS)}")
+        else:
+            report_trend(window, end)
+
+    else:
+        raise ValueError(f"unknown view: {length}")
+
+def command_settings(args):
+    user_settings = get_settings()
+    user_settings.update(parse_fields(args, SETTING_FIELDS))
+    save_settings(user_settings)
+    app_print(", ".join(f"{key}: {user_settings[key]}" for key in ["calorie_goal", "protein_goal", "weight_goal", "console_max_lines"]))
+
+# =========================
+# Bulk import
+# =========================
+# import FILE reads a .csv (header row of field names) or .jsonl file (one
+# {"date": ..., field: value} object per line, or the journal's
+# {"date": ..., "day": {...}}) a row at a time. Field names and values are
+# checked like a typed log (LOG_FIELDS, parse_na / parse_weight); other
+# columns, such as an export's total_cal, are ignored. Days already logged
+# follow the policy:
+#   fill       only set what the day is missing, like update_today
+#   skip       leave the day as it is
+#   overwrite  replace the day with the row
+# Every row is read and checked before any is applied, and only applying
+# them holds the calendar lock, IMPORT_BATCH days at a time. Nothing is
+# written per day; the whole calendar is saved once at the end.
+
+IMPORT_POLICIES = ["fill", "skip", "overwrite"]
+
+# bad rows reported one by one before just counting them
+IMPORT_ERRORS_SHOWN = 10
+
+# days applied per hold of the calendar lock, so lookups get a turn
+IMPORT_BATCH = 1000
+
+def iter_import_rows(path):
+    # (line number, row) for every row of the file, one at a time; a row
+    # that is not a JSON object comes through as None
+    if path.lower().endswith(".kcol"):
+        for line_no, row in enumerate(columnar.iter_rows(path), 1):
+            yield line_no, row
+    elif path.lower().endswith(".csv"):
+        with open(path, "r", newline="") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+    else:
+        with open(path, "r") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError:
+                    yield line_no, None
+
+def import_row(row):
+    # row -> (date, {day key: value}), ValueError if it is not a valid day
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+    if isinstance(row.get("day"), dict):
+        row = {"date": row.get("date"), **row["day"]}
+    if not row.get("date"):
+        raise ValueError("no date")
+    date_str = parse_date(str(row["date"]).strip())
+    args = [
+        f"{name.strip()}={'' if raw is None else raw}"
+        for name, raw in row.items()
+        if name is not None and name.strip().lower() in LOG_FIELDS
+    ]
+    return date_str, parse_fields(args, LOG_FIELDS)
+
+def merge_day(date_str, values, policy):
+    # True when the calendar changed
+    day = kcalendar.get(date_str)
+    if day is None or policy == "overwrite":
+        set_day_values(date_str, values, replace=True)
+        return True
+    if policy == "skip":
+        return False
+    changed = False
+    for key, value in values.items():
+        if day.get(key) is None and value is not None:
+            day[key] = value
+            changed = True
+    return changed
+
+def import_file(path, policy="fill"):
+    if policy not in IMPORT_POLICIES:
+        raise ValueError(f"policy must be one of {', '.join(IMPORT_POLICIES)}")
+    start = time.perf_counter()
+    rows = changed = bad = 0
+    # the GUI and the HTTP server carry on while the file is read
+    parsed = []
+    for line_no, row in iter_import_rows(path):
+        rows += 1
+        try:
+            parsed.append(import_row(row))
+        except ValueError as e:
+            bad += 1
+            if bad <= IMPORT_ERRORS_SHOWN:
+                app_print(f"line {line_no}: {e}, skipped")
+    if parsed:
+        # the months involved are read before the lock is held for the batch
+        kcalendar.ensure(min(date_str for date_str, _ in parsed), max(date_str for date_str, _ in parsed))
+    for first in range(0, len(parsed), IMPORT_BATCH):
+        with kcalendar.views.writing(), kcalendar.lock:
+            for date_str, values in parsed[first:first + IMPORT_BATCH]:
+                if merge_day(date_str, values, policy):
+                    changed += 1
+    if changed:
+        kcalendar.save_all()
+    seconds = time.perf_counter() - start
+    rate = rows / seconds if seconds > 0 else 0
+    app_print(f"imported {changed} days from {rows} rows ({bad} skipped as invalid) "
+              f"in {seconds:.2f}s, {rate:.0f} rows/s")
+
+# =========================
+# Export
+# =========================
+# export FILE [START [END]] writes the logged days from START to END (both
+# optional, inclusive) in date order, each with total_cal, the goal flags and
+# the distance from weight_goal added. The format follows the extension:
+# .csv, .jsonl or .kcol (see columnar.py). Rows are made one at a time from
+# EXPORT_CHUNK_DAYS of the calendar at once and written as they come.
+
+EXPORT_FIELDS = [("date", "date")] + [(key, "float" if key == WEIGHT_KEY else "int") for key in DAY_KEYS] + [
+    ("total_cal", "int"),
+    ("under_calorie_goal", "bool"),
+    ("protein_goal_hit", "bool"),
+    ("weight_to_goal", "float"),
+]
+EXPORT_FORMATS = [".csv", ".jsonl", ".kcol"]
+EXPORT_CHUNK_DAYS = 366
+
+def export_row(date_str, day, user_settings):
+    tcal = total_cal(day)
+    calorie_goal = user_settings.get("calorie_goal")
+    weight_goal = user_settings.get("weight_goal")
+    weight = day.get(WEIGHT_KEY)
+    row = {"date": date_str}
+    row.update((key, day.get(key)) for key in DAY_KEYS)
+    row["total_cal"] = tcal
+    row["under_calorie_goal"] = None if calorie_goal is None else tcal <= calorie_goal
+    row["protein_goal_hit"] = goal_hit(day.get(PROTEIN_KEY), user_settings.get("protein_goal"))
+    row["weight_to_goal"] = None if weight is None or weight_goal is None else round(weight - weight_goal, 1)
+    return row
+
+def iter_export_rows(start=None, end=None):
+    user_settings = get_settings()
+    with kcalendar.lock:
+        kcalendar.ensure(start, end)
+        bounds = kcalendar.columns.bounds()
+    if bounds is None:
+        return
+    first, last = bounds
+    if start is not None:
+        first = max(first, datetime.date.fromisoformat(start).toordinal())
+    if end is not None:
+        last = min(last, datetime.date.fromisoformat(end).toordinal())
+    for chunk_start in range(first, last + 1, EXPORT_CHUNK_DAYS):
+        chunk_end = min(chunk_start + EXPORT_CHUNK_DAYS - 1, last)
+        days = kcalendar.days_between(
+            datetime.date.fromordinal(chunk_start).isoformat(),
+            datetime.date.fromordinal(chunk_end).isoformat(),
+        )
+        for date_str, day in days:
+            yield export_row(date_str, day, user_settings)
+
+def export_file(path, start=None, end=None):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"file must end in {', '.join(EXPORT_FORMATS)}")
+    start = None if start is None else parse_date(start)
+    end = None if end is None else parse_date(end)
+    began = time.perf_counter()
+    rows = iter_export_rows(start, end)
+    count = 0
+    if extension == ".kcol":
+        count = columnar.write_rows(path, EXPORT_FIELDS, rows)
+    else:
+        with open(path, "w", newline="") as f:
+            if extension == ".csv":
+                writer = csv.writer(f)
+                writer.writerow([name for name, _ in EXPORT_FIELDS])
+                for row in rows:
+                    writer.writerow(["" if value is None else value for value in row.values()])
+                    count += 1
+            else:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+                    count += 1
+    seconds = time.perf_counter() - began
+    rate = count / seconds if seconds > 0 else 0
+    app_print(f"exported {count} days to {path} in {seconds:.2f}s, {rate:.0f} rows/s")
+
+def run_file(path):
+    # every line of path as a command; blank lines and # comments skipped.
+    # Stops at the first line that fails and fails with it.
+    result = True
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            result = handle_command(line)
+            if result is COMMAND_FAILED:
+                app_print(f"{path}:{line_no}: failed, the lines after it were not run")
+            if result is COMMAND_FAILED or not result:
+                break
+    flush_saves(compact=False)
+    return result
+
+def handle_command(cmd: str):
     global APP_RUNNING
-    app_print("what would you like to do?")
-    global user_settings
-    while APP_RUNNING:
-        app_print("__________________________________________")
-        response = app_input("options: (log, update, view, settings, quit): ").strip().lower()
-        
-        if response == "log":
+    try:
+        args = shlex.split(cmd)
+    except ValueError as e:
+        app_print(f"could not read command: {e}")
+        return COMMAND_FAILED
+    if not args:
+        return True
+    command, args = args[0].lower(), args[1:]
+    # days saved meanwhile by another window or a script
+    kcalendar.refresh()
+
+    try:
+        if command == "log" and not args:
             log_update()
             seperator()
+        elif command == "log":
+            command_log(args, replace=True)
 
-        elif response == "update":
+        elif command == "update" and not args:
             update_today()
             seperator()
-        
-        elif response == "settings":
-            user_settings = setting_menu(user_settings)
-        
-        elif response == "view":
-            length = app_input("what would you like to view? (day/week/month): ").strip().lower()
+        elif command == "update":
+            command_log(args, replace=False)
+
+        elif command == "settings" and not args:
+            setting_menu(get_settings())
+        elif command == "settings":
+            command_settings(args)
+
+        elif command == "view" and len(args) <= 1:
+            length = args[0].lower() if args else app_input("what would you like to view? (day/week/month/year/trend): ").strip().lower()
             if length == "day":
                 view_day()
                 seperator()
@@ -670,10 +1549,78 @@ def main_loop():
                 view_month()
                 seperator()
 
-        elif response == "quit":
+            if length == "year":
+                view_year()
+                seperator()
+
+            if length == "trend":
+                view_trend()
+                seperator()
+        elif command == "view":
+            command_view(args)
+
+        elif command == "import" and 1 <= len(args) <= 2:
+            import_file(args[0], *(arg.lower() for arg in args[1:]))
+        elif command == "export" and 1 <= len(args) <= 3:
+            export_file(*args)
+        elif command == "profile" and len(args) <= 2:
+            command_profile(args)
+        elif command == "migrate" and len(args) == 1:
+            migrate_storage(args[0])
+        elif command == "convert" and len(args) == 2:
+            convert_file(args[0], args[1])
+        elif command == "archive" and len(args) == 1:
+            archive_year(int(args[0]))
+        elif command == "run" and len(args) == 1:
+            return run_file(args[0])
+
+        elif command == "quit":
             APP_RUNNING = False
+            flush_saves()
+            return False
+
+        elif command == "help":
+            for line in COMMAND_HELP:
+                app_print(line)
+        else:
+            app_print(f"unknown command: {cmd.strip()} (type help for the list)")
+            return COMMAND_FAILED
+    except (ValueError, IndexError, OSError) as e:
+        app_print(f"could not run '{cmd.strip()}': {e or 'missing a value'}")
+        app_print("type help for the list of commands")
+        return COMMAND_FAILED
+    return True
+
+def main_loop():
+    global COMMAND_RUNNING
+    app_print("what would you like to do?")
+    while APP_RUNNING:
+        app_print("__________________________________________")
+        response = app_input("options: (log, update, view, settings, quit): ").strip()
+        # includes the time spent at the command's prompts
+        name = response.split(" ", 1)[0].lower()
+        if name not in ["log", "update", "view", "settings", "quit", "run", "import", "export", "profile"]:
+            name = "other"
+        COMMAND_RUNNING = True
+        try:
+            with instrument.timed(f"command {name}"):
+                keep_going = handle_command(response)
+        finally:
+            COMMAND_RUNNING = False
+        if not keep_going:
             break
 
 
 if __name__ == "__main__":
-    main_loop()
\ No newline at end of file
+    sys.argv = instrument.configure_from_argv(sys.argv)
+    status = 0
+    if len(sys.argv) > 1:
+        # python main.py log 2026-01-30 b=550 ..., python main.py run FILE;
+        # exits 1 when the command (or a line of the file) failed
+        if instrument.run(lambda: handle_command(shlex.join(sys.argv[1:]))) is COMMAND_FAILED:
+            status = 1
+        flush_saves(compact=False)
+    else:
+        instrument.run(main_loop)
+    instrument.report(app_print, BASE_DIR)
+    sys.exit(status)
\ No newline at end of file
@@ -0,0 +1,230 @@
+from array import array
+from itertools import accumulate
+from columns import ColumnSlice, to_ordinal
+from storage import PROTEIN_KEY, WEIGHT_KEY, DAY_KEYS
+
+# "calories" is the day's total_cal, the rest are the raw day keys
+STAT_KEYS = ["calories"] + DAY_KEYS
+
+
+class RangeStats:
+    def __init__(self, days, sums, counts, first_weight, last_weight, protein_hits=None):
+        self.days = days
+        self.sums = sums
+        self.counts = counts
+        self.first_weight = first_weight
+        self.last_weight = last_weight
+        # days at or over the protein goal, None when no goal was given
+        self.protein_hits = protein_hits
+
+    def mean(self, key):
+        if self.counts[key] == 0:
+            return None
+        return self.sums[key] / self.counts[key]
+
+
+# slots per block, see BlockPrefix; a write costs about BLOCK additions in
+# its block plus one per block after it, under 400 for a century
+BLOCK = 256
+
+
+class BlockPrefix:
+    # prefix sums of one column kept a block of BLOCK slots at a time: the
+    # sum of column[:i] is before[i // BLOCK] + within[i], within being the
+    # running total inside i's block and before the total of every block
+    # ahead of it. A write redoes one block's running totals and the
+    # before entries after it, instead of every slot after it.
+    def __init__(self, typecode):
+        self.typecode = typecode
+        self.size = 0
+        self.within = array(typecode, [0])
+        self.totals = array(typecode, [0])
+        self.before = array(typecode, [0])
+
+    def resize(self, size):
+        # the block holding slot size is included, for the prefix at size
+        blocks = size // BLOCK + 1
+        self.size = size
+        del self.within[size + 1:]
+        self.within.extend(array(self.typecode, bytes(self.within.itemsize * (size + 1 - len(self.within)))))
+        for column in [self.totals, self.before]:
+            del column[blocks:]
+            column.extend(array(self.typecode, bytes(column.itemsize * (blocks - len(column)))))
+
+    def redo(self, column_slice, blocks):
+        # blocks is a sorted list of block numbers; column_slice(lo, hi)
+        # gives the column's slots lo..hi-1
+        for block in blocks:
+            lo = block * BLOCK
+            hi = min(lo + BLOCK, self.size + 1)
+            self.within[lo:hi] = array(self.typecode, accumulate(column_slice(lo, hi - 1), initial=0))
+            self.totals[block] = sum(column_slice(lo, min(lo + BLOCK, self.size)))
+        first = blocks[0]
+        self.before[first + 1:] = array(self.typecode, accumulate(self.totals[first:-1], initial=self.before[first]))[1:]
+
+    def total(self, lo, hi):
+        # sum of column[lo:hi]
+        return (self.before[hi // BLOCK] + self.within[hi]) - (self.before[lo // BLOCK] + self.within[lo])
+
+    def nbytes(self):
+        return sum(len(column) * column.itemsize for column in [self.within, self.totals, self.before])
+
+
+# =========================
+# RangeIndex
+# =========================
+# Running totals over the calendar's columns, one BlockPrefix per total:
+# days logged, sum and count per stat key, and protein goal hits. Any
+# start..end total is then a few lookups. A write only marks its block; the
+# marked blocks are redone on the next query, so editing any day, old or
+# new, costs about the same. First and last weight come from a C-level
+# search of the weight validity bytes.
+
+class RangeIndex:
+    def __init__(self, kcalendar):
+        self.kcalendar = kcalendar
+        self._base = None
+        self._size = 0
+        # blocks written since the last query
+        self._dirty = set()
+        self._days = BlockPrefix("q")
+        self._sums = {key: BlockPrefix("d") for key in STAT_KEYS}
+        self._counts = {key: BlockPrefix("q") for key in STAT_KEYS}
+        # protein goal -> hits, kept for the goals asked for so far
+        self._hits = {}
+        kcalendar.columns.watchers.append(self.changed)
+
+    def nbytes(self):
+        return sum(prefix.nbytes() for prefix, _ in self._prefixes())
+
+    def changed(self, ordinal):
+        if self._base is not None and ordinal >= self._base:
+            self._dirty.add((ordinal - self._base) // BLOCK)
+
+    def _hit_slice(self, goal):
+        protein = self.kcalendar.columns.values[PROTEIN_KEY]
+        valid = self.kcalendar.columns.valid[PROTEIN_KEY]
+        return lambda lo, hi: (ok and value >= goal for value, ok in zip(protein[lo:hi], valid[lo:hi]))
+
+    def _prefixes(self):
+        # (BlockPrefix, column_slice) for every total kept
+        columns = self.kcalendar.columns
+        yield self._days, lambda lo, hi: columns.present[lo:hi]
+        for key in STAT_KEYS:
+            yield self._sums[key], lambda lo, hi, column=columns.values[key]: column[lo:hi]
+            yield self._counts[key], lambda lo, hi, column=columns.valid[key]: column[lo:hi]
+        for goal, hits in self._hits.items():
+            yield hits, self._hit_slice(goal)
+
+    def _refresh(self):
+        columns = self.kcalendar.columns
+        size = len(columns.present)
+        if columns.base != self._base:
+            # the columns grew backwards, every slot moved
+            self._base = columns.base
+            self._size = 0
+        if size != self._size:
+            # slots past the old end (columns grown forwards) are new
+            self._dirty.update(range(self._size // BLOCK, size // BLOCK + 1))
+            self._size = size
+        if not self._dirty:
+            return
+        blocks = sorted(self._dirty)
+        self._dirty.clear()
+        for prefix, column_slice in self._prefixes():
+            if prefix.size != size:
+                prefix.resize(size)
+            prefix.redo(column_slice, blocks)
+
+    def _protein_hits(self, goal, lo, hi):
+        hits = self._hits.get(goal)
+        if hits is None:
+            hits = self._hits[goal] = BlockPrefix("q")
+            hits.resize(self._size)
+            hits.redo(self._hit_slice(goal), list(range(self._size // BLOCK + 1)))
+        return hits.total(lo, hi)
+
+    def _weight(self, lo, hi, last=False):
+        columns = self.kcalendar.columns
+        valid = columns.valid[WEIGHT_KEY]
+        slot = valid.rfind(1, lo, hi) if last else valid.find(1, lo, hi)
+        return None if slot < 0 else columns.values[WEIGHT_KEY][slot]
+
+    def stats(self, start, end, protein_goal=None):
+        # start and end are inclusive YYYY-MM-DD dates, None for open ends
+        with self.kcalendar.lock:
+            self.kcalendar.ensure(start, end)
+            self._refresh()
+            lo, hi = self.kcalendar.columns._range(
+                None if start is None else to_ordinal(start),
+                None if end is None else to_ordinal(end),
+            )
+            return RangeStats(
+                self._days.total(lo, hi),
+                {key: self._sums[key].total(lo, hi) for key in STAT_KEYS},
+                {key: self._counts[key].total(lo, hi) for key in STAT_KEYS},
+                self._weight(lo, hi),
+                self._weight(lo, hi, last=True),
+                None if protein_goal is None else self._protein_hits(protein_goal, lo, hi),
+            )
+
+
+def pad_slice(column_slice, start, end):
+    # column_slice widened to cover ordinals start..end (inclusive), the
+    # days outside the history's slots being unlogged
+    total = end - start + 1
+    size = len(column_slice.present)
+    lead = total if size == 0 else min(max(column_slice.start - start, 0), total)
+    tail = max(total - lead - size, 0)
+    if not lead and not tail:
+        return column_slice
+    return ColumnSlice(
+        start,
+        bytes(lead) + column_slice.present + bytes(tail),
+        {key: array("d", bytes(8 * lead)) + values + array("d", bytes(8 * tail))
+         for key, values in column_slice.values.items()},
+        {key: bytes(lead) + valid + bytes(tail) for key, valid in column_slice.valid.items()},
+    )
+
+
+def moving_average(column_slice, key, window):
+    # (ordinal, mean of the logged values in the window days ending there)
+    # for every slot of the slice, None when nothing was logged; a running
+    # sum, so each step adds the day entering the window and drops the one
+    # leaving it
+    values = column_slice.values[key]
+    valid = column_slice.valid[key]
+    total = 0.0
+    count = 0
+    for i, (value, ok) in enumerate(zip(values, valid)):
+        if ok:
+            total += value
+            count += 1
+        if i >= window and valid[i - window]:
+            total -= values[i - window]
+            count -= 1
+        yield column_slice.start + i, (total / count if count else None)
+
+
+# heatmap colour buckets for a day's total calories against calorie_goal
+NO_LOG, LOGGED, WELL_UNDER, UNDER, OVER, WELL_OVER = range(6)
+
+
+def calorie_buckets(column_slice, goal):
+    # one bucket byte per day of the slice, in a single pass over it; with
+    # no goal set every logged day is just LOGGED
+    buckets = bytearray(len(column_slice.present))
+    for i, (present, calories) in enumerate(zip(column_slice.present, column_slice.values["calories"])):
+        if not present:
+            continue
+        if not goal:
+            buckets[i] = LOGGED
+        elif calories < goal * 0.9:
+            buckets[i] = WELL_UNDER
+        elif calories <= goal:
+            buckets[i] = UNDER
+        elif calories <= goal * 1.1:
+            buckets[i] = OVER
+        else:
+            buckets[i] = WELL_OVER
+    return buckets
@@ -0,0 +1,140 @@
+import argparse
+import datetime
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import main as backend
+import instrument
+
+# =========================
+# Local JSON service
+# =========================
+# python server.py [--host 127.0.0.1] [--port 8765] keeps one loaded,
+# indexed kcalendar in memory and answers with the same JSON as
+# main.py's view ... --json:
+#   GET  /day/YYYY-MM-DD
+#   GET  /week/YYYY-MM-DD          (the 7 days starting there)
+#   GET  /month/YYYY-MM
+#   GET  /year/YYYY[/YYYY]
+#   GET  /trend/WINDOW[/YYYY-MM-DD]
+#   POST /log/YYYY-MM-DD           body {"b": 550, "w": 95.4, ...}, replaces the day
+#   POST /update[/YYYY-MM-DD]      same body, only changes the given fields
+# Field names and values are checked like one-line commands (LOG_FIELDS).
+# Requests are handled on their own threads. Views share the calendar's
+# views lock, so any number build at once; a POST, or the writer thread
+# merging days other processes saved, takes it alone, so a view never sees
+# half of either. Each request first merges in days other processes saved.
+# A POST changes the day in memory and returns; the calendar's writer thread
+# saves it, like save_day in main.py, together with any other day changed
+# within save_delay.
+
+DEFAULT_PORT = 8765
+
+# years one /year request may cover; a longer span is a 400 rather than a
+# huge response built while POSTs wait
+MAX_YEARS = 20
+
+
+def get_view(parts):
+    # parts of a GET path -> the JSON-ready report, ValueError / IndexError
+    # for a bad date or a missing part
+    length, args = parts[0], parts[1:]
+    if length == "day" and len(args) == 1:
+        return backend.day_json(backend.parse_date(args[0]))
+    if length == "week" and len(args) == 1:
+        return backend.week_json(backend.parse_date(args[0]))
+    if length == "month" and len(args) == 1:
+        month_start = datetime.date.fromisoformat(args[0] + "-01")
+        return backend.month_json(month_start.year, month_start.month)
+    if length == "year" and 1 <= len(args) <= 2:
+        first_year, last_year = backend.parse_years(" ".join(args))
+        if last_year - first_year + 1 > MAX_YEARS:
+            raise ValueError(f"at most {MAX_YEARS} years at a time")
+        return backend.year_json(first_year, last_year)
+    if length == "trend" and 1 <= len(args) <= 2:
+        end = datetime.date.fromisoformat(backend.parse_date(args[1])) if len(args) > 1 else datetime.date.today()
+        return backend.trend_json(int(args[0]), end)
+    return None
+
+
+def post_log(parts, body):
+    command, args = parts[0], parts[1:]
+    if command not in ["log", "update"] or len(args) > 1 or (command == "log" and not args):
+        return None
+    if not isinstance(body, dict):
+        raise ValueError("body must be a JSON object of fields")
+    date_str = backend.parse_date(args[0]) if args else datetime.date.today().isoformat()
+    args = [f"{name}={'' if value is None else value}" for name, value in body.items()]
+    backend.set_day_values(date_str, backend.parse_fields(args, backend.LOG_FIELDS), replace=command == "log")
+    backend.save_day(date_str)
+    return backend.day_json(date_str)
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "kcalendar"
+
+    def send_json(self, status, value):
+        data = json.dumps(value).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_request(self, method):
+        parts = [part for part in urlsplit(self.path).path.split("/") if part]
+        if not parts:
+            self.send_json(404, {"error": "unknown endpoint"})
+            return
+        try:
+            with instrument.timed(f"http {method} {parts[0]}"):
+                kcalendar = backend.kcalendar
+                kcalendar.refresh()
+                if method == "GET":
+                    with kcalendar.views.reading():
+                        result = get_view(parts)
+                else:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    with kcalendar.views.writing():
+                        result = post_log(parts, body)
+        except (ValueError, IndexError) as e:
+            self.send_json(400, {"error": str(e) or "missing a value"})
+            return
+        if result is None:
+            self.send_json(404, {"error": "unknown endpoint"})
+        else:
+            self.send_json(200, result)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+
+def serve(host, port):
+    with instrument.timed("http warm up"):
+        # read the whole history and build the range index once, up front
+        backend.get_settings()
+        backend.range_stats(None, None)
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    print(f"kcalendar serving on http://{host}:{port}/ (ctrl+c to stop)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        backend.kcalendar.close()
+        instrument.report(print, backend.BASE_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve kcalendar as local JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(instrument.configure_from_argv(sys.argv)[1:])
+    serve(args.host, args.port)
@@ -0,0 +1,1301 @@
+import calendar
+import codecs
+import datetime
+import heapq
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections.abc import MutableMapping
+from columns import DayColumns, to_ordinal
+from locking import FileLock, RWLock, file_signature
+from debounce import DebouncedWriter
+import instrument
+
+MEALS = ["breakfast", "lunch", "dinner"]
+BURNT_KEY = "burnt"
+PROTEIN_KEY = "protein"
+WEIGHT_KEY = "weight"
+DAY_KEYS = MEALS + [BURNT_KEY, PROTEIN_KEY, WEIGHT_KEY]
+
+
+# =========================
+# Streaming JSON reader
+# =========================
+# Reads a {"date": {...}, ...} file one day at a time, so memory use is one
+# read chunk plus one day no matter how big the file is. The snapshot is
+# always written with indent=2 and sort_keys, so every day starts on a line
+# of its own indented by two spaces, in date order: a windowed read
+# binary-searches the file for its first day and stops at the first key past
+# end, reading only the window and a few blocks either side of it.
+
+def in_window(date_str, start, end):
+    return (start is None or date_str >= start) and (end is None or date_str <= end)
+
+
+def _top_level_key(line):
+    # the key of a '  "key": ...' line, None for any other line (the keys
+    # inside a day are indented further)
+    if not line.startswith(b'  "'):
+        return None
+    try:
+        return json.JSONDecoder().raw_decode(line.decode(), 2)[0]
+    except ValueError:
+        return None
+
+
+def seek_json_day(f, start, block=1 << 16):
+    # byte offset in f (opened "rb") of the line of the first day >= start,
+    # or None if the file is not laid out as described above
+    f.seek(0)
+    if f.readline().rstrip() != b"{" or _top_level_key(f.readline()) is None:
+        return None
+    lo = 2
+    hi = f.seek(0, 2)
+    while hi - lo > block:
+        mid = (lo + hi) // 2
+        # from the start of the first line at or after mid
+        f.seek(mid - 1)
+        f.readline()
+        pos = f.tell()
+        key = None
+        while pos < hi:
+            line = f.readline()
+            key = _top_level_key(line)
+            if key is not None:
+                break
+            pos += len(line)
+        if key is None or pos >= hi:
+            hi = mid
+        elif key < start:
+            lo = pos + len(line)
+        else:
+            hi = pos
+    f.seek(lo)
+    pos = lo
+    while True:
+        line = f.readline()
+        key = _top_level_key(line)
+        # the file's closing brace when every day is before start
+        if not line or line.startswith(b"}") or (key is not None and key >= start):
+            return pos
+        pos += len(line)
+
+
+def iter_json_days(path, start=None, end=None, chunk_size=1 << 16):
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        buf = ""
+        pos = 0
+        eof = False
+        offset = None if start is None else seek_json_day(f, start)
+        if offset is None:
+            f.seek(0)
+        else:
+            # read on from the window's first day as if it were the first
+            f.seek(offset)
+            buf = "{"
+
+        def more():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + text.decode(chunk, final=eof)
+            pos = 0
+
+        def skip_space():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos].isspace():
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                more()
+
+        def expect(chars):
+            nonlocal pos
+            skip_space()
+            if pos >= len(buf) or buf[pos] not in chars:
+                raise ValueError(f"{path}: expected one of {chars!r} in day file")
+            pos += 1
+            return buf[pos - 1]
+
+        def value():
+            nonlocal pos
+            skip_space()
+            while True:
+                try:
+                    item, end_pos = decoder.raw_decode(buf, pos)
+                    # a value that runs to the end of the buffer may be cut short
+                    if end_pos < len(buf) or eof:
+                        pos = end_pos
+                        return item
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                more()
+
+        expect("{")
+        skip_space()
+        if pos < len(buf) and buf[pos] == "}":
+            return
+        while True:
+            date_str = value()
+            expect(":")
+            day = value()
+            if end is not None and date_str > end:
+                return
+            if in_window(date_str, start, end):
+                yield date_str, day
+            if expect(",}") == "}":
+                return
+
+
+# =========================
+# Engines
+# =========================
+# An engine only knows how to read and write days on disk. "ranged" engines
+# can load any date range on its own, so Calendar reads them a month at a
+# time; the others are read into memory once and kept there.
+#
+# Another process (the CLI next to the GUI, a second window) may save the
+# same files. Calendar holds locked() around every save and every
+# changes() call. changes() returns the (date, day) pairs saved by someone
+# else since this engine last read or wrote, or None if there are none. It
+# is cheap when nothing changed: a stat, or a pragma for sqlite.
+
+class JsonStorage:
+    name = "json"
+    ranged = False
+
+    # every save appends one line to the journal; the journal is folded back
+    # into the snapshot once it gets this long, and when the app quits
+    compact_at = 200
+
+    def __init__(self, data_file, journal_file):
+        self.data_file = data_file
+        self.journal_file = journal_file
+        self.journal_entries = 0
+        self.file_lock = FileLock(data_file + ".lock")
+        # what this process has seen: the snapshot's file_signature and how
+        # far into the journal it has read, both set by the first load
+        self._snapshot = None
+        self._journal_offset = None
+
+    def locked(self):
+        return self.file_lock
+
+    def _read_journal(self, offset):
+        # (records, offset just past the last whole line) from offset on
+        records = []
+        if not os.path.exists(self.journal_file):
+            return records, 0
+        with open(self.journal_file, "rb") as j:
+            j.seek(offset)
+            for line in j:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError(line)
+                    records.append(json.loads(line))
+                except ValueError:
+                    # a save cut short by a crash (or still being written by
+                    # another process), everything before it is fine
+                    break
+                offset += len(line)
+        return records, offset
+
+    def load(self, start=None, end=None):
+        # (date, day) pairs for start..end, journaled days replacing the
+        # snapshot's copy; the journal is small, so it is read in full first
+        snapshot = file_signature(self.data_file)
+        records, offset = self._read_journal(0)
+        if self._journal_offset is None:
+            # later loads (the rest of a windowed history) leave these alone,
+            # so changes() still sees what was saved since the first one
+            self._snapshot, self._journal_offset = snapshot, offset
+            self.journal_entries = len(records)
+        journaled = {}
+        for record in records:
+            if in_window(record["date"], start, end):
+                journaled[record["date"]] = record["day"]
+
+        if os.path.exists(self.data_file):
+            for date_str, day in iter_json_days(self.data_file, start, end):
+                yield date_str, journaled.pop(date_str, day)
+        yield from journaled.items()
+
+    def changes(self):
+        if self._journal_offset is None:
+            return None
+        if file_signature(self.data_file) != self._snapshot or self._journal_size() < self._journal_offset:
+            # another process compacted: the snapshot is new, so read it all
+            self._journal_offset = None
+            return list(self.load())
+        records, offset = self._read_journal(self._journal_offset)
+        if not records:
+            return None
+        # only the tail another process appended
+        self._journal_offset = offset
+        self.journal_entries += len(records)
+        return [(record["date"], record["day"]) for record in records]
+
+    def _journal_size(self):
+        signature = file_signature(self.journal_file)
+        return 0 if signature is None else signature[1]
+
+    def _trim_journal(self):
+        # cut off a torn last line (a save cut short by a crash) before
+        # appending, or every later save would land after it and be lost on
+        # the next load; runs under the file lock after changes() has read
+        # every whole line, so nothing past the offset is another's save
+        offset = self._journal_offset
+        if offset is None:
+            offset = self._read_journal(0)[1]
+        if self._journal_size() > offset:
+            with open(self.journal_file, "r+b") as j:
+                j.truncate(offset)
+
+    def write_day(self, date_str, day):
+        record = {"date": date_str, "day": day}
+        self._trim_journal()
+        with instrument.timed("save journal"):
+            # bytes, so a line ends in "\n" on Windows too and the offset
+            # kept below is the line's size on disk
+            line = (json.dumps(record, sort_keys=True) + "\n").encode()
+            with open(self.journal_file, "ab") as j:
+                j.write(line)
+        instrument.add_bytes("save journal", len(line))
+        self.journal_entries += 1
+        if self._journal_offset is not None:
+            self._journal_offset += len(line)
+        return self.journal_entries >= self.compact_at
+
+    def flush(self, days):
+        if self.journal_entries == 0 and os.path.exists(self.data_file):
+            return
+        self.write_all(days)
+
+    def write_all(self, days):
+        tmp_file = self.data_file + ".tmp"
+        with instrument.timed("save data file"):
+            with open(tmp_file, "w") as f:
+                json.dump(dict(days), f, indent=2, sort_keys=True)
+                size = f.tell()
+            os.replace(tmp_file, self.data_file)
+        instrument.add_bytes("save data file", size)
+        # the snapshot now holds every journaled day
+        with open(self.journal_file, "w"):
+            pass
+        self.journal_entries = 0
+        self._snapshot = file_signature(self.data_file)
+        self._journal_offset = 0
+
+    def close(self):
+        pass
+
+
+class SqliteStorage:
+    name = "sqlite"
+    ranged = True
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._conn = None
+        self.thread_lock = threading.RLock()
+        self._columns = ", ".join(DAY_KEYS)
+        # PRAGMA data_version and the last day_changes row seen
+        self._data_version = None
+        self._seq = 0
+
+    def locked(self):
+        # sqlite locks the database against other processes itself, every
+        # write is one transaction; this only keeps a refresh on one thread
+        # from landing between another thread's copy of a day and its write
+        return self.thread_lock
+
+    @property
+    def conn(self):
+        # opened on first query, so creating the engine touches no files
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            # WITHOUT ROWID keeps the rows clustered on the date primary key,
+            # so day/week/month lookups are index range scans
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS days ("
+                "date TEXT PRIMARY KEY, "
+                + ", ".join(f"{key} {'REAL' if key == WEIGHT_KEY else 'INTEGER'}" for key in DAY_KEYS)
+                + ") WITHOUT ROWID"
+            )
+            # every saved date, in order, so changes() can read just those
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS day_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT)"
+            )
+            for event in ["INSERT", "UPDATE"]:
+                self._conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS days_{event.lower()} AFTER {event} ON days "
+                    "BEGIN INSERT INTO day_changes (date) VALUES (NEW.date); END"
+                )
+            self._conn.commit()
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self._seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM day_changes").fetchone()[0]
+        return self._conn
+
+    def changes(self):
+        if self._conn is None:
+            return None
+        # data_version only moves when another connection commits
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return None
+        self._data_version = version
+        rows = self._conn.execute(
+            f"SELECT c.seq, d.date, {', '.join('d.' + key for key in DAY_KEYS)} "
+            "FROM day_changes c JOIN days d ON d.date = c.date WHERE c.seq > ? ORDER BY c.seq",
+            (self._seq,),
+        ).fetchall()
+        if not rows:
+            return None
+        self._seq = rows[-1][0]
+        return [(row[1], self._row_to_day(row[2:])) for row in rows]
+
+    def _row_to_day(self, row):
+        return dict(zip(DAY_KEYS, row))
+
+    def load(self, start=None, end=None):
+        query = f"SELECT date, {self._columns} FROM days"
+        args = []
+        if start is not None and end is not None:
+            query += " WHERE date BETWEEN ? AND ?"
+            args = [start, end]
+        elif start is not None:
+            query += " WHERE date >= ?"
+            args = [start]
+        elif end is not None:
+            query += " WHERE date <= ?"
+            args = [end]
+        query += " ORDER BY date"
+        for row in self.conn.execute(query, args):
+            yield row[0], self._row_to_day(row[1:])
+
+    def _row_values(self, date_str, day):
+        return [date_str] + [day.get(key) for key in DAY_KEYS]
+
+    def write_day(self, date_str, day):
+        with self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO days (date, {self._columns}) "
+                f"VALUES ({', '.join('?' * (len(DAY_KEYS) + 1))})",
+                self._row_values(date_str, day),
+            )
+        return False
+
+    def flush(self, days):
+        self.conn.commit()
+
+    def write_all(self, days):
+        with self.conn:
+            self.conn.execute("DELETE FROM days")
+            # the inserts below log every day again
+            self.conn.execute("DELETE FROM day_changes")
+            self.conn.executemany(
+                f"INSERT INTO days (date, {self._columns}) "
+                f"VALUES ({', '.join('?' * (len(DAY_KEYS) + 1))})",
+                (self._row_values(date_str, day or {}) for date_str, day in days),
+            )
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def retry_shared(fn, attempts=100, delay=0.01):
+    # windows refuses to resize or replace a file another process has mapped
+    # (or open); BinaryStorage only maps it there for the length of a read
+    # or write, so wait a moment and try again
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(delay)
+
+
+class BinaryStorage:
+    name = "binary"
+    ranged = True
+
+    # header: magic, version, record size, ordinal of slot 0, slot count,
+    # days saved so far, then the ordinal each of the last LOG saves wrote
+    # (save n at n % LOG), so changes() can find another process's saves
+    # without comparing records
+    LOG = 64
+    HEADER = struct.Struct("<4sHHqqQ" + "q" * LOG)
+    # (base, slots), the save count and one log entry, for updating the
+    # header in place
+    BOUNDS = struct.Struct("<qq")
+    BOUNDS_AT = 8
+    SAVES = struct.Struct("<Q")
+    SAVES_AT = 24
+    LOG_ENTRY = struct.Struct("<q")
+    LOG_AT = 32
+    # record: flags, then every DAY_KEYS value as a float64
+    RECORD = struct.Struct("<H" + "d" * len(DAY_KEYS))
+    MAGIC = b"KCAL"
+    VERSION = 2
+    # version 1 had no save count or log, the records were the same
+    HEADER_V1 = struct.Struct("<4sHHqq")
+    # flags: bit 0 = day logged, then one "value present" bit per key, then
+    # one "value is an int" bit per key so ints come back as ints
+    PRESENT = 1
+    # new slots are added this many at a time
+    chunk = 366
+    # keep the file mapped between reads and writes; windows can't resize or
+    # replace a file another process has mapped, so there it is mapped only
+    # while in use
+    keep_mapped = os.name != "nt"
+
+    def __init__(self, bin_file):
+        self.bin_file = bin_file
+        # keys that are not YYYY-MM-DD dates cannot be given a slot
+        self.extra_file = bin_file + ".extra.json"
+        self._file = None
+        self._map = None
+        self.base = None
+        self.slots = 0
+        self.file_lock = FileLock(bin_file + ".lock")
+        # the header's save count as of this process's last read or write,
+        # None until the first
+        self._saves = None
+
+    def locked(self):
+        return self.file_lock
+
+    def _valid_bit(self, i):
+        return 1 << (1 + i)
+
+    def _int_bit(self, i):
+        return 1 << (1 + len(DAY_KEYS) + i)
+
+    def _header(self, base, slots, saves=0):
+        return self.HEADER.pack(self.MAGIC, self.VERSION, self.RECORD.size, base, slots, saves, *[0] * self.LOG)
+
+    def _open(self):
+        if self._file is not None:
+            return
+        if not os.path.exists(self.bin_file):
+            # written under a temp name and linked into place, so another
+            # process never opens it before the header is in, and keeps the
+            # file if another process made it first
+            tmp_file = f"{self.bin_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(self._header(0, 0))
+            try:
+                os.link(tmp_file, self.bin_file)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_file)
+        self._file = open(self.bin_file, "r+b")
+        while True:
+            # mapped again if another process was part way through a resize
+            # (size and header not agreeing yet), so base and slots always
+            # describe the records mapped
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            magic, version, record_size = self.HEADER_V1.unpack_from(self._map)[:3]
+            if magic == self.MAGIC and version == 1 and record_size == self.RECORD.size:
+                self.close()
+                self._upgrade()
+                self._file = open(self.bin_file, "r+b")
+                continue
+            if magic != self.MAGIC or version != self.VERSION or record_size != self.RECORD.size:
+                self.close()
+                raise ValueError(f"{self.bin_file} is not a kcalendar day file")
+            base, slots = self.BOUNDS.unpack_from(self._map, self.BOUNDS_AT)
+            saves = self.SAVES.unpack_from(self._map, self.SAVES_AT)[0]
+            if len(self._map) == self.HEADER.size + slots * self.RECORD.size:
+                break
+            self._map.close()
+        self.base = base if slots else None
+        self.slots = slots
+        if self._saves is None:
+            self._saves = saves
+
+    def _upgrade(self):
+        # a version 1 file: the same records after the longer header
+        with open(self.bin_file, "rb") as f:
+            data = f.read()
+        _, _, _, base, slots = self.HEADER_V1.unpack_from(data)
+        tmp_file = f"{self.bin_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(self._header(base, slots))
+            f.write(data[self.HEADER_V1.size:])
+        retry_shared(lambda: os.replace(tmp_file, self.bin_file))
+
+    def _release(self):
+        if not self.keep_mapped:
+            self.close()
+
+    def _resize(self, base, slots, shift=0):
+        # grow the file to hold slots records starting at ordinal base;
+        # shift moves the existing records up when base moved down
+        self._map.close()
+        old_size = self.HEADER.size + self.slots * self.RECORD.size
+        try:
+            retry_shared(lambda: self._file.truncate(self.HEADER.size + slots * self.RECORD.size))
+        finally:
+            # still usable if the file could not be resized
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        if shift:
+            start = self.HEADER.size
+            self._map.move(start + shift * self.RECORD.size, start, old_size - start)
+            self._map[start:start + shift * self.RECORD.size] = bytes(shift * self.RECORD.size)
+        self.base = base
+        self.slots = slots
+        # last, so a process opening the file meanwhile sees the size and
+        # header disagree until the records are in place
+        self.BOUNDS.pack_into(self._map, self.BOUNDS_AT, base, slots)
+
+    def _offset(self, ordinal):
+        if self.base is None:
+            return None
+        slot = ordinal - self.base
+        if 0 <= slot < self.slots:
+            return self.HEADER.size + slot * self.RECORD.size
+        return None
+
+    def _read(self, offset):
+        flags, *values = self.RECORD.unpack_from(self._map, offset)
+        if not flags & self.PRESENT:
+            return None
+        day = {}
+        for i, (key, value) in enumerate(zip(DAY_KEYS, values)):
+            if not flags & self._valid_bit(i):
+                day[key] = None
+            elif flags & self._int_bit(i):
+                day[key] = int(value)
+            else:
+                day[key] = value
+        return day
+
+    def _pack(self, day):
+        flags = self.PRESENT
+        values = []
+        day = day or {}
+        for i, key in enumerate(DAY_KEYS):
+            value = day.get(key)
+            if value is None:
+                values.append(0.0)
+                continue
+            flags |= self._valid_bit(i)
+            if isinstance(value, int):
+                flags |= self._int_bit(i)
+            values.append(float(value))
+        return flags, values
+
+    def _load_extra(self):
+        if not os.path.exists(self.extra_file):
+            return {}
+        with open(self.extra_file, "r") as f:
+            return json.load(f)
+
+    def _save_extra(self, extra):
+        if not extra and not os.path.exists(self.extra_file):
+            return
+        tmp_file = self.extra_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(extra, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.extra_file)
+
+    def load(self, start=None, end=None):
+        self._open()
+        try:
+            if self.base is not None:
+                first = 0 if start is None else max(to_ordinal(start) - self.base, 0)
+                last = self.slots - 1 if end is None else min(to_ordinal(end) - self.base, self.slots - 1)
+                for slot in range(first, last + 1):
+                    day = self._read(self.HEADER.size + slot * self.RECORD.size)
+                    if day is not None:
+                        yield datetime.date.fromordinal(self.base + slot).isoformat(), day
+        finally:
+            self._release()
+        if start is None and end is None:
+            yield from self._load_extra().items()
+
+    def write_day(self, date_str, day):
+        ordinal = to_ordinal(date_str)
+        if ordinal is None:
+            extra = self._load_extra()
+            extra[date_str] = day
+            self._save_extra(extra)
+            return False
+        self._open()
+        try:
+            if self.base is None:
+                self._resize(ordinal, self.chunk)
+            elif ordinal < self.base:
+                shift = max(self.base - ordinal, self.chunk)
+                self._resize(self.base - shift, self.slots + shift, shift)
+            elif ordinal >= self.base + self.slots:
+                self._resize(self.base, max(ordinal - self.base + 1, self.slots + self.chunk))
+            flags, values = self._pack(day)
+            self.RECORD.pack_into(self._map, self._offset(ordinal), flags, *values)
+            # logged after the record, the count last
+            saves = self.SAVES.unpack_from(self._map, self.SAVES_AT)[0] + 1
+            self.LOG_ENTRY.pack_into(self._map, self.LOG_AT + (saves % self.LOG) * self.LOG_ENTRY.size, ordinal)
+            self.SAVES.pack_into(self._map, self.SAVES_AT, saves)
+            # saves by others not yet picked up are still left for changes()
+            if self._saves == saves - 1:
+                self._saves = saves
+        finally:
+            self._release()
+        return False
+
+    def changes(self):
+        if self._saves is None:
+            return None
+        signature = file_signature(self.bin_file)
+        if signature is None:
+            return None
+        self._open()
+        try:
+            if signature[0] != os.fstat(self._file.fileno()).st_ino:
+                # replaced by another process's write_all
+                self.close()
+                self._saves = None
+                self._open()
+                return list(self.load())
+            base, slots = self.BOUNDS.unpack_from(self._map, self.BOUNDS_AT)
+            if slots != self.slots or (slots and base != self.base):
+                # resized by another process: the slots moved, the dates in
+                # the log did not
+                self.close()
+                self._open()
+            saves = self.SAVES.unpack_from(self._map, self.SAVES_AT)[0]
+            if saves == self._saves:
+                return None
+            if saves - self._saves > self.LOG:
+                # more saves than the log holds
+                self._saves = saves
+                return list(self.load())
+            ordinals = {
+                self.LOG_ENTRY.unpack_from(self._map, self.LOG_AT + (n % self.LOG) * self.LOG_ENTRY.size)[0]
+                for n in range(self._saves + 1, saves + 1)
+            }
+            self._saves = saves
+            changed = []
+            for ordinal in sorted(ordinals):
+                offset = self._offset(ordinal)
+                day = None if offset is None else self._read(offset)
+                if day is not None:
+                    changed.append((datetime.date.fromordinal(ordinal).isoformat(), day))
+            return changed or None
+        finally:
+            self._release()
+
+    def flush(self, days):
+        if self._map is not None:
+            self._map.flush()
+
+    def write_all(self, days):
+        extra = {}
+        dated = []
+        for date_str, day in days:
+            ordinal = to_ordinal(date_str)
+            if ordinal is None:
+                extra[date_str] = day
+            else:
+                dated.append((ordinal, day))
+        self.close()
+
+        tmp_file = self.bin_file + ".tmp"
+        base = min(ordinal for ordinal, _ in dated) if dated else 0
+        slots = max(ordinal for ordinal, _ in dated) - base + 1 if dated else 0
+        records = bytearray(slots * self.RECORD.size)
+        for ordinal, day in dated:
+            flags, values = self._pack(day)
+            self.RECORD.pack_into(records, (ordinal - base) * self.RECORD.size, flags, *values)
+        with open(tmp_file, "wb") as f:
+            f.write(self._header(base, slots))
+            f.write(records)
+        retry_shared(lambda: os.replace(tmp_file, self.bin_file))
+        self._save_extra(extra)
+        self._saves = None
+        self._open()
+        self._release()
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ShardedStorage:
+    name = "sharded"
+    ranged = True
+
+    # shard for keys that are not YYYY-MM-DD dates
+    OTHER = "other"
+
+    def __init__(self, shard_dir):
+        # one {date: day} file per month, e.g. data/2026-01.json, listed in
+        # data/manifest.json by month with its path relative to shard_dir
+        self.shard_dir = shard_dir
+        self.manifest_file = os.path.join(shard_dir, "manifest.json")
+        self._manifest = None
+        # the last shard written, so logging day after day reads it once
+        self._last_key = None
+        self._last_shard = None
+        self.file_lock = FileLock(os.path.join(shard_dir, ".lock"))
+        # file_signature of the manifest and of each shard this process has
+        # read or written, and the months the manifest listed when read;
+        # every save touches the manifest, so an unchanged signature means
+        # nothing was saved
+        self._manifest_signature = None
+        self._shard_signatures = {}
+        self._known = None
+
+    def locked(self):
+        return self.file_lock
+
+    def _shard_key(self, date_str):
+        if to_ordinal(date_str) is None:
+            return self.OTHER
+        return date_str[:7]
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest_signature = file_signature(self.manifest_file)
+            if os.path.exists(self.manifest_file):
+                with open(self.manifest_file, "r") as f:
+                    self._manifest = json.load(f)
+            else:
+                self._manifest = {"shards": {}}
+            if self._known is None:
+                self._known = set(self._manifest["shards"])
+        return self._manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.shard_dir, exist_ok=True)
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.manifest_file)
+        self._manifest_signature = file_signature(self.manifest_file)
+        self._known.update(self.manifest["shards"])
+
+    def _touch_manifest(self):
+        # move the manifest's mtime on (by at least a microsecond, whatever
+        # the clock says) so another process's changes() looks at the shards
+        mtime = max(time.time_ns(), self._manifest_signature[2] + 1000)
+        os.utime(self.manifest_file, ns=(mtime, mtime))
+        self._manifest_signature = file_signature(self.manifest_file)
+
+    def _read_shard(self, key):
+        if key == self._last_key:
+            return self._last_shard
+        path = self.manifest["shards"].get(key)
+        if path is None:
+            return {}
+        full_path = os.path.join(self.shard_dir, path)
+        self._shard_signatures[key] = file_signature(full_path)
+        with open(full_path, "r") as f:
+            return json.load(f)
+
+    def _write_shard(self, key, shard):
+        path = self.manifest["shards"].get(key, f"{key}.json")
+        full_path = os.path.join(self.shard_dir, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        tmp_file = full_path + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(shard, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, full_path)
+        self._shard_signatures[key] = file_signature(full_path)
+        if key not in self.manifest["shards"]:
+            self.manifest["shards"][key] = path
+            self._save_manifest()
+
+    def _months(self, start, end):
+        return sorted(
+            key for key in self.manifest["shards"]
+            if key != self.OTHER
+            and (start is None or key >= start[:7])
+            and (end is None or key <= end[:7])
+        )
+
+    def load(self, start=None, end=None):
+        for key in self._months(start, end):
+            shard = self._read_shard(key)
+            for date_str in sorted(shard):
+                if in_window(date_str, start, end):
+                    yield date_str, shard[date_str]
+        if start is None and end is None:
+            yield from self._read_shard(self.OTHER).items()
+
+    def write_day(self, date_str, day):
+        key = self._shard_key(date_str)
+        shard = self._read_shard(key)
+        shard[date_str] = day
+        self._write_shard(key, shard)
+        self._touch_manifest()
+        self._last_key, self._last_shard = key, shard
+        return False
+
+    def flush(self, days):
+        pass
+
+    def changes(self):
+        if self._manifest is None:
+            return None
+        signature = file_signature(self.manifest_file)
+        if signature == self._manifest_signature:
+            return None
+        if signature is None or self._manifest_signature is None or signature[:2] != self._manifest_signature[:2]:
+            # rewritten: months added (or archived) by another process
+            self._manifest = None
+        else:
+            # only touched by another process's saves
+            self._manifest_signature = signature
+        shards = self.manifest["shards"]
+        # shards read before whose file changed, and months that are new
+        # since the manifest was first read
+        keys = [key for key, signature in self._shard_signatures.items()
+                if key in shards and file_signature(os.path.join(self.shard_dir, shards[key])) != signature]
+        keys += [key for key in shards if key not in self._known and key not in self._shard_signatures]
+        self._known.update(shards)
+        if not keys:
+            return None
+        if self._last_key in keys:
+            self._last_key = self._last_shard = None
+        return [(date_str, day) for key in keys for date_str, day in self._read_shard(key).items()]
+
+    def write_all(self, days):
+        shards = {}
+        for date_str, day in days:
+            shards.setdefault(self._shard_key(date_str), {})[date_str] = day
+        old_paths = dict(self.manifest["shards"])
+        self._last_key = self._last_shard = None
+        self._manifest = {"shards": {}}
+        self._shard_signatures = {}
+        for key, shard in shards.items():
+            self.manifest["shards"][key] = f"{key}.json"
+            self._write_shard(key, shard)
+        self._save_manifest()
+        for key, path in old_paths.items():
+            if self.manifest["shards"].get(key) != path:
+                os.remove(os.path.join(self.shard_dir, path))
+
+    def archive(self, year):
+        # move a year's shards to archive/<year>/; they stay readable through
+        # the manifest, but current months are never rewritten alongside them
+        moved = 0
+        for key in self._months(f"{year}-01", f"{year}-12"):
+            path = self.manifest["shards"][key]
+            new_path = f"archive/{year}/{key}.json"
+            if path == new_path:
+                continue
+            os.makedirs(os.path.join(self.shard_dir, "archive", str(year)), exist_ok=True)
+            os.replace(os.path.join(self.shard_dir, path), os.path.join(self.shard_dir, new_path))
+            self.manifest["shards"][key] = new_path
+            moved += 1
+        if moved:
+            self._save_manifest()
+        return moved
+
+    def close(self):
+        self._last_key = self._last_shard = None
+
+
+# =========================
+# Calendar (what main.py calls kcalendar)
+# =========================
+# Behaves like the old {date: day} dict for lookups, and adds range queries
+# and explicit saves on top of whichever engine it was opened with. Days are
+# held in DayColumns; get() hands out DayView objects that read and write
+# straight through to the columns. Nothing is opened or read until the first
+# lookup (or preload()), so creating a Calendar costs no file I/O.
+
+def months_between(start, end):
+    year, month = int(start[:4]), int(start[5:7])
+    end_year, end_month = int(end[:4]), int(end[5:7])
+    while (year, month) <= (end_year, end_month):
+        yield f"{year:04d}-{month:02d}"
+        month += 1
+        if month > 12:
+            month = 1
+            year += 1
+
+
+class DayView(MutableMapping):
+    __slots__ = ("_calendar", "_ordinal")
+
+    def __init__(self, kcalendar, ordinal):
+        self._calendar = kcalendar
+        self._ordinal = ordinal
+
+    def __getitem__(self, key):
+        if key not in DAY_KEYS:
+            raise KeyError(key)
+        # the GUI reads days while the backend thread may be growing the columns
+        with self._calendar.lock:
+            return self._calendar.columns.get(self._ordinal, key)
+
+    def __setitem__(self, key, value):
+        if key not in DAY_KEYS:
+            raise KeyError(key)
+        self._calendar.set_value(self._ordinal, key, value)
+
+    def __delitem__(self, key):
+        self[key] = None
+
+    def __iter__(self):
+        return iter(DAY_KEYS)
+
+    def __len__(self):
+        return len(DAY_KEYS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class Calendar:
+    # save_later() writes once this many seconds pass with no other edit
+    save_delay = 0.5
+
+    def __init__(self, open_engine):
+        self._open_engine = open_engine
+        self._engine = None
+        self.lock = threading.RLock()
+        # engine reads and writes. Saves hold engine.locked(), then self.lock
+        # just long enough to copy the days, then io_lock to write them, so
+        # lookups never wait on a save's disk I/O; a lookup that has to load
+        # takes io_lock inside self.lock. Always in that order.
+        self.io_lock = threading.RLock()
+        # held to read several days as one consistent picture (the HTTP
+        # server's views), and to change days as a whole (a POST, or merging
+        # what other processes saved); taken after engine.locked() and
+        # before self.lock
+        self.views = RWLock()
+        self._compacting = False
+        # the last compaction a save started, see finish_saves()
+        self._compactor = None
+        # called as listener(date_str, old, new) whenever a day changes, with
+        # old/new being DayColumns rows (None when the day had no log)
+        self.listeners = []
+        self.columns = DayColumns(DAY_KEYS, MEALS, [WEIGHT_KEY])
+        # keys that are not YYYY-MM-DD dates, from logs typed before dates
+        # were parsed; kept as plain dicts so saving does not drop them
+        self._extra = {}
+        # ranged engines are read a month at a time, on first use; the
+        # others either in full, or just a start..end window (see preload)
+        self._loaded_months = set()
+        self._window = None
+        self._complete = False
+        # dates changed by save_later() and not on disk yet; a refresh
+        # leaves them alone
+        self._unsaved = set()
+        self.writer = DebouncedWriter(self.save_days, self.save_delay)
+
+    @property
+    def engine(self):
+        with self.lock:
+            if self._engine is None:
+                self._engine = self._open_engine()
+            return self._engine
+
+    def preload(self, start=None, end=None):
+        # load start..end (None for open ends) on a background thread; lookups
+        # made meanwhile wait on the lock, and lookups outside the window
+        # later read the rest of the history
+        def run():
+            with self.lock:
+                if self._complete:
+                    return
+                if start is None and end is None:
+                    self._ensure(None, None)
+                elif self.engine.ranged:
+                    self._ensure(start, end or datetime.date.today().isoformat())
+                elif self._window is None:
+                    self._load(start, end)
+                    self._window = (start, end)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def _fill(self, days):
+        for date_str, day in days:
+            ordinal = to_ordinal(date_str)
+            if ordinal is None:
+                self._extra.setdefault(date_str, day)
+            elif not self.columns.has(ordinal):
+                self.columns.set_day(ordinal, day)
+
+    def _load(self, start=None, end=None):
+        engine = self.engine
+        with self.io_lock:
+            self._fill(engine.load(start, end))
+
+    def _ensure(self, start, end):
+        if self._complete or self._window_covers(start, end):
+            return
+        if start is None or end is None or not self.engine.ranged:
+            self._load()
+            self._complete = True
+            return
+        missing = [m for m in months_between(start, end) if m not in self._loaded_months]
+        if missing:
+            last_year, last_month = int(missing[-1][:4]), int(missing[-1][5:7])
+            last_day = calendar.monthrange(last_year, last_month)[1]
+            self._load(missing[0] + "-01", f"{missing[-1]}-{last_day:02d}")
+            self._loaded_months.update(missing)
+
+    def ensure(self, start, end):
+        # make sure start..end (inclusive, None for open ends) is in memory
+        with self.lock:
+            self._ensure(start, end)
+
+    def _window_covers(self, start, end):
+        if self._window is None or start is None:
+            return False
+        window_start, window_end = self._window
+        if window_start is not None and start < window_start:
+            return False
+        return window_end is None or (end is not None and end <= window_end)
+
+    def _date(self, ordinal):
+        return datetime.date.fromordinal(ordinal).isoformat()
+
+    def _notify(self, date_str, old, new):
+        for listener in self.listeners:
+            listener(date_str, old, new)
+
+    def _refresh(self, keep=()):
+        # merge the days another process saved since the engine last looked,
+        # listeners hearing about each day that really changed; keep holds
+        # dates about to be saved from memory, which win over the disk copy
+        if self._engine is None:
+            return
+        with self.io_lock:
+            changes = self._engine.changes()
+        for date_str, day in changes or ():
+            ordinal = to_ordinal(date_str)
+            if date_str in keep:
+                continue
+            if ordinal is None:
+                self._extra[date_str] = day
+                continue
+            if date_str in self._unsaved:
+                continue
+            day = {key: (day or {}).get(key) for key in DAY_KEYS}
+            if self.columns.has(ordinal) and self.columns.day(ordinal) == day:
+                continue
+            old = self.columns.row(ordinal)
+            self.columns.set_day(ordinal, day)
+            self._notify(date_str, old, self.columns.row(ordinal))
+
+    def refresh(self):
+        # pick up saves made by other processes; a stat or two when there
+        # are none, so it can run before every command
+        engine = self._engine
+        if engine is None:
+            return
+        with engine.locked(), self.views.writing(), self.lock:
+            self._refresh()
+
+    def get(self, date_str, default=None):
+        ordinal = to_ordinal(date_str)
+        with self.lock:
+            if ordinal is None:
+                return self._extra.get(date_str, default)
+            self._ensure(date_str, date_str)
+            if self.columns.has(ordinal):
+                return DayView(self, ordinal)
+            return default
+
+    def __getitem__(self, date_str):
+        day = self.get(date_str, KeyError)
+        if day is KeyError:
+            raise KeyError(date_str)
+        return day
+
+    def __setitem__(self, date_str, day):
+        ordinal = to_ordinal(date_str)
+        with self.lock:
+            if ordinal is None:
+                self._extra[date_str] = day
+                return
+            self._ensure(date_str, date_str)
+            old = self.columns.row(ordinal)
+            self.columns.set_day(ordinal, day)
+            self._notify(date_str, old, self.columns.row(ordinal))
+
+    def set_value(self, ordinal, key, value):
+        with self.lock:
+            old = self.columns.row(ordinal)
+            self.columns.set_value(ordinal, key, value)
+            self._notify(self._date(ordinal), old, self.columns.row(ordinal))
+
+    def __contains__(self, date_str):
+        with self.lock:
+            if date_str in self._extra:
+                return True
+            return self.get(date_str) is not None
+
+    def dates(self):
+        with self.lock:
+            return [date_str for date_str, _ in self._iter_plain()]
+
+    def __iter__(self):
+        return iter(self.dates())
+
+    def __len__(self):
+        with self.lock:
+            self._ensure(None, None)
+            return self.columns.count + len(self._extra)
+
+    def slice(self, start, end):
+        # DayColumns slice for start..end (inclusive YYYY-MM-DD dates)
+        with self.lock:
+            self._ensure(start, end)
+            return self.columns.slice(to_ordinal(start), to_ordinal(end))
+
+    def days_between(self, start=None, end=None):
+        # sorted (date, day) pairs with start <= date <= end, both inclusive;
+        # keys that are not dates only show up in the unbounded listing
+        with self.lock:
+            if start is None and end is None:
+                self._ensure(None, None)
+                views = ((self._date(o), DayView(self, o)) for o in self.columns.ordinals())
+                return list(heapq.merge(views, sorted(self._extra.items())))
+            self._ensure(start, end)
+            start_ordinal = None if start is None else to_ordinal(start)
+            end_ordinal = None if end is None else to_ordinal(end)
+            return [(self._date(o), DayView(self, o)) for o in self.columns.ordinals(start_ordinal, end_ordinal)]
+
+    def items(self):
+        return self.days_between()
+
+    def _plain(self, date_str):
+        ordinal = to_ordinal(date_str)
+        if ordinal is None:
+            return self._extra[date_str]
+        return self.columns.day(ordinal)
+
+    def _plain_days(self, columns, extra):
+        days = ((self._date(o), columns.day(o)) for o in columns.ordinals())
+        return heapq.merge(days, sorted(extra.items()))
+
+    def _iter_plain(self):
+        # every day as a plain dict, in date order, for the engines to write;
+        # a generator, so the caller holds the lock while consuming it
+        self._ensure(None, None)
+        return self._plain_days(self.columns, self._extra)
+
+    def _copy_plain(self):
+        # like _iter_plain, but over a copy of the columns taken now, so the
+        # caller can let go of the lock before consuming it
+        self._ensure(None, None)
+        return self._plain_days(self.columns.copy(), dict(self._extra))
+
+    def plain_items(self):
+        with self.lock:
+            return list(self._iter_plain())
+
+    def save_day(self, date_str, day=None):
+        if day is not None:
+            self[date_str] = day
+        self.save_days([date_str])
+
+    def save_later(self, date_str, day=None):
+        # like save_day, but the write happens on the writer thread once the
+        # edits stop for save_delay seconds; flush() and close() write
+        # anything still waiting
+        with self.lock:
+            if day is not None:
+                self[date_str] = day
+            self._unsaved.add(date_str)
+        self.writer.mark(date_str)
+
+    def save_days(self, dates):
+        # write each of dates as it is in memory, under one file lock; must
+        # not be called holding self.lock (see io_lock)
+        engine = self.engine
+        with instrument.timed("save day"), engine.locked():
+            with self.views.writing(), self.lock:
+                self._refresh(keep=set(dates))
+                days = [(date_str, self._plain(date_str)) for date_str in dates]
+                # an edit made while writing adds its date back
+                self._unsaved.difference_update(dates)
+            wants_flush = False
+            try:
+                with self.io_lock:
+                    for date_str, day in days:
+                        wants_flush = engine.write_day(date_str, day) or wants_flush
+            except BaseException:
+                with self.lock:
+                    self._unsaved.update(dates)
+                raise
+
+        with self.lock:
+            if wants_flush and not self._compacting:
+                self._compactor = threading.Thread(target=self.flush, daemon=True)
+                self._compactor.start()
+
+    def save_all(self):
+        # every day in one engine write_all (a temp file swapped in, or one
+        # transaction) instead of a write_day per changed day
+        engine = self.engine
+        with instrument.timed("save all"), engine.locked():
+            with self.views.writing(), self.lock:
+                self._refresh()
+                days = self._copy_plain()
+            with self.io_lock:
+                engine.write_all(days)
+
+    def flush(self):
+        # days waiting on the writer first, outside the lock the writer
+        # thread needs
+        self.writer.flush()
+        with self.lock:
+            engine = self._engine
+            if self._compacting or engine is None:
+                return
+            self._compacting = True
+        try:
+            with engine.locked():
+                with self.views.writing(), self.lock:
+                    # a compaction must not drop days journaled elsewhere
+                    self._refresh()
+                    days = None if engine.ranged else self._copy_plain()
+                with self.io_lock:
+                    engine.flush(days)
+        finally:
+            with self.lock:
+                self._compacting = False
+
+    def finish_saves(self):
+        # days waiting on the writer, and any compaction their saves
+        # started, without compacting otherwise; for a process about to exit
+        self.writer.flush()
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def close(self):
+        engine = self._engine
+        if engine is None:
+            return
+        self.flush()
+        with self.io_lock:
+            engine.close()
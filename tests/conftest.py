@@ -0,0 +1,34 @@
+import collections
+import os
+import sys
+import tempfile
+import pytest
+
+# the modules live at the top of the repo, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# main.py keeps its files next to itself otherwise
+os.environ["KCALENDAR_HOME"] = tempfile.mkdtemp(prefix="kcalendar-tests-")
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    # main with its profiles in tmp_path and nothing loaded yet; what it
+    # prints is collected in backend.printed
+    import main
+    monkeypatch.setattr(main, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "PROFILES_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(main, "PROFILES_FILE", str(tmp_path / "kcalendar.profiles.json"))
+    for name in ["profile_config", "PROFILE", "PROFILE_DIR", "SETTINGS_FILE", "loaded_settings"]:
+        monkeypatch.setattr(main, name, None)
+    monkeypatch.setattr(main, "resident_profiles", collections.OrderedDict())
+    monkeypatch.setattr(main, "heatmap_cache", {})
+    main.load_profile()
+    monkeypatch.setattr(main, "kcalendar", main.open_profile_calendar())
+    printed = []
+    monkeypatch.setattr(main, "app_print", lambda *args: printed.append(" ".join(str(arg) for arg in args)))
+    monkeypatch.setattr(main, "printed", printed, raising=False)
+    yield main
+    main.flush_saves()
+    for cal, _, _ in main.resident_profiles.values():
+        cal.close()
+    main.kcalendar.close()
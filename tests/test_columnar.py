@@ -0,0 +1,56 @@
+import datetime
+import pytest
+import columnar
+from columnar import write_rows, iter_rows
+
+SCHEMA = [["date", "date"], ["calories", "int"], ["weight", "float"], ["goal_met", "bool"]]
+
+
+def rows(count):
+    start = datetime.date(2020, 1, 1).toordinal()
+    for i in range(count):
+        yield {
+            "date": datetime.date.fromordinal(start + i).isoformat(),
+            "calories": None if i % 5 == 0 else 1800 + i,
+            "weight": None if i % 3 == 0 else 80.0 + i / 10,
+            "goal_met": None if i % 7 == 0 else i % 2 == 0,
+        }
+
+
+def test_write_then_read_rows(tmp_path, monkeypatch):
+    # small row groups so the rows span several of them
+    monkeypatch.setattr(columnar, "ROW_GROUP_ROWS", 4)
+    path = str(tmp_path / "days.kcol")
+    assert write_rows(path, SCHEMA, rows(11)) == 11
+
+    read = list(iter_rows(path))
+    assert read == list(rows(11))
+    assert type(read[1]["calories"]) is int
+
+
+def test_read_some_columns(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "ROW_GROUP_ROWS", 4)
+    path = str(tmp_path / "days.kcol")
+    write_rows(path, SCHEMA, rows(9))
+
+    assert list(iter_rows(path, ["date", "weight"])) == [
+        {"date": row["date"], "weight": row["weight"]} for row in rows(9)
+    ]
+
+
+def test_no_rows(tmp_path):
+    path = str(tmp_path / "days.kcol")
+    assert write_rows(path, SCHEMA, []) == 0
+    assert list(iter_rows(path)) == []
+
+
+def test_unknown_column_type(tmp_path):
+    with pytest.raises(ValueError):
+        write_rows(str(tmp_path / "days.kcol"), [["date", "text"]], [])
+
+
+def test_not_a_kcol_file(tmp_path):
+    path = tmp_path / "days.kcol"
+    path.write_bytes(b"not columnar data at all")
+    with pytest.raises(ValueError):
+        list(iter_rows(str(path)))
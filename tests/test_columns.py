@@ -0,0 +1,74 @@
+import datetime
+from columns import DayColumns, to_ordinal
+from storage import MEALS, WEIGHT_KEY, DAY_KEYS
+
+
+def columns():
+    return DayColumns(DAY_KEYS, MEALS, [WEIGHT_KEY])
+
+
+def test_none_and_zero_are_kept_apart():
+    cols = columns()
+    jan1 = to_ordinal("2026-01-01")
+    cols.set_day(jan1, {"breakfast": 0, "lunch": None, "dinner": 600, "weight": 80.0})
+    assert cols.row(jan1) == {
+        "calories": 600, "breakfast": 0, "lunch": None, "dinner": 600,
+        "burnt": None, "protein": None, "weight": 80.0,
+    }
+    # ints stay ints, weight stays a float
+    assert type(cols.get(jan1, "dinner")) is int
+    assert type(cols.get(jan1, WEIGHT_KEY)) is float
+    assert cols.day(jan1) == {"breakfast": 0, "lunch": None, "dinner": 600, "burnt": None, "protein": None, "weight": 80.0}
+
+
+def test_days_without_a_log():
+    cols = columns()
+    jan1 = to_ordinal("2026-01-01")
+    cols.set_day(jan1 + 10, {"breakfast": 100})
+    # an empty day is still a logged day, with every value None
+    cols.set_day(jan1, {})
+    assert cols.has(jan1) and cols.has(jan1 + 10)
+    assert not cols.has(jan1 + 5) and cols.row(jan1 + 5) is None
+    assert cols.row(jan1)["calories"] == 0 and cols.row(jan1)["breakfast"] is None
+    assert not cols.has(jan1 - 1000) and cols.get(jan1 + 1000, "breakfast") is None
+    assert cols.count == 2
+    assert cols.bounds() == (jan1, jan1 + 10)
+
+
+def test_set_value_updates_calories():
+    cols = columns()
+    jan1 = to_ordinal("2026-01-01")
+    cols.set_day(jan1, {"breakfast": 100, "lunch": 200})
+    cols.set_value(jan1, "dinner", 300)
+    cols.set_value(jan1, "breakfast", None)
+    assert cols.get(jan1, "calories") == 500
+    assert cols.get(jan1, "breakfast") is None
+
+
+def test_grows_both_ways_and_slices():
+    cols = columns()
+    days = ["2026-03-01", "2020-02-29", "2031-12-31"]
+    for i, date_str in enumerate(days):
+        cols.set_day(to_ordinal(date_str), {"breakfast": i + 1, "weight": 70.0 + i})
+    assert [cols.get(to_ordinal(d), "breakfast") for d in days] == [1, 2, 3]
+    assert [datetime.date.fromordinal(o).isoformat() for o in cols.ordinals()] == sorted(days)
+
+    part = cols.slice(to_ordinal("2020-01-01"), to_ordinal("2026-12-31"))
+    assert [datetime.date.fromordinal(o).isoformat() for o in part.ordinals()] == ["2020-02-29", "2026-03-01"]
+    assert list(part.logged("breakfast")) == [2.0, 1.0]
+    assert list(part.logged_with_ordinal(WEIGHT_KEY)) == [(to_ordinal("2020-02-29"), 71.0), (to_ordinal("2026-03-01"), 70.0)]
+
+    copy = cols.copy()
+    copy.set_day(to_ordinal("2026-03-01"), {"breakfast": 9})
+    assert cols.get(to_ordinal("2026-03-01"), "breakfast") == 1
+    assert cols.nbytes() == copy.nbytes() > 0
+
+
+def test_watchers_hear_every_write():
+    cols = columns()
+    heard = []
+    cols.watchers.append(heard.append)
+    jan1 = to_ordinal("2026-01-01")
+    cols.set_day(jan1, {"breakfast": 1})
+    cols.set_value(jan1, "lunch", 2)
+    assert heard == [jan1, jan1]
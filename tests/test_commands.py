@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_log_then_view(backend):
+    assert backend.handle_command("log 2026-01-30 b=550 l=350 d=na w=80.5") is True
+    assert backend.handle_command("update 2026-01-30 d=1000") is True
+    backend.printed.clear()
+    assert backend.handle_command("view day 2026-01-30 --json") is True
+    day = json.loads(backend.printed[-1])
+    assert (day["breakfast"], day["lunch"], day["dinner"], day["weight"]) == (550, 350, 1000, 80.5)
+    assert day["total_cal"] == 1900
+
+
+def test_failed_commands(backend):
+    for cmd in ["log bad-date b=1", "log 2026-01-30 x=1", "view week", "bogus", 'log "2026-01-30']:
+        assert backend.handle_command(cmd) is backend.COMMAND_FAILED
+    assert "2026-01-30" not in backend.kcalendar
+
+
+def test_run_file_stops_at_failed_line(backend, tmp_path):
+    path = tmp_path / "commands.txt"
+    path.write_text("# two days\nlog 2026-01-01 b=100\n\nlog nope b=1\nlog 2026-01-02 b=200\n")
+    assert backend.handle_command(f"run {path}") is backend.COMMAND_FAILED
+    assert f"{path}:4: failed, the lines after it were not run" in backend.printed
+    assert backend.kcalendar["2026-01-01"]["breakfast"] == 100
+    assert "2026-01-02" not in backend.kcalendar
+
+    path.write_text("log 2026-01-01 b=100\nlog 2026-01-02 b=200\n")
+    assert backend.handle_command(f"run {path}") is True
+    assert backend.kcalendar["2026-01-02"]["breakfast"] == 200
+
+
+def test_one_shot_exit_status(tmp_path):
+    env = dict(os.environ, KCALENDAR_HOME=str(tmp_path))
+
+    def run(*args):
+        return subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), *args], env=env, capture_output=True).returncode
+
+    assert run("log", "2026-01-30", "b=550") == 0
+    assert run("log", "bad-date", "b=550") == 1
+    assert run("view", "day", "2026-01-30", "--json") == 0
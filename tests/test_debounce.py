@@ -0,0 +1,82 @@
+import threading
+import time
+from debounce import DebouncedWriter
+
+
+def wait_for(condition, timeout=5):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.005)
+
+
+def test_burst_is_one_write_after_the_delay():
+    writes = []
+    writer = DebouncedWriter(writes.append, 0.05)
+    for key in ["b", "a", "b", "c"]:
+        writer.mark(key)
+    assert writer.pending() == ["b", "a", "c"]
+    assert writes == []
+    wait_for(lambda: writes)
+    time.sleep(0.1)
+    assert writes == [["b", "a", "c"]]
+    assert writer.pending() == []
+
+
+def test_flush_writes_now_on_the_calling_thread():
+    threads = []
+    writer = DebouncedWriter(lambda keys: threads.append((keys, threading.current_thread())), 60)
+    writer.mark("a")
+    writer.flush()
+    assert threads == [(["a"], threading.current_thread())]
+    # nothing pending, nothing written
+    writer.flush()
+    assert len(threads) == 1
+
+
+def test_mark_during_a_write_is_written_next():
+    started = threading.Event()
+    release = threading.Event()
+    writes = []
+
+    def write(keys):
+        writes.append(keys)
+        if len(writes) == 1:
+            started.set()
+            release.wait(5)
+
+    writer = DebouncedWriter(write, 0.01)
+    writer.mark("a")
+    assert started.wait(5)
+    # marked while "a" is still being written
+    writer.mark("b")
+    release.set()
+    wait_for(lambda: len(writes) == 2)
+    writer.flush()
+    assert writes == [["a"], ["b"]]
+
+
+def test_failed_write_is_tried_again(capsys):
+    writes = []
+
+    def write(keys):
+        writes.append(keys)
+        if len(writes) == 1:
+            raise OSError("disk full")
+
+    writer = DebouncedWriter(write, 0.01)
+    writer.mark("a")
+    wait_for(lambda: len(writes) == 2)
+    assert writes == [["a"], ["a"]]
+    assert "disk full" in capsys.readouterr().err
+
+
+def test_calendar_saves_a_burst_of_edits_once(backend, tmp_path):
+    for i in range(5):
+        backend.handle_command(f"update 2026-01-01 b={i}")
+        backend.handle_command(f"update 2026-01-02 b={i}")
+    backend.flush_saves(compact=False)
+    # one journal line per day, not per edit
+    lines = (tmp_path / "kcalendar.journal").read_text().splitlines()
+    assert [line[:22] for line in lines] == ['{"date": "2026-01-01",', '{"date": "2026-01-02",']
+    assert backend.kcalendar.engine.journal_entries == 2
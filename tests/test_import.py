@@ -0,0 +1,65 @@
+import json
+import pytest
+
+
+def write_csv(tmp_path):
+    path = tmp_path / "days.csv"
+    path.write_text(
+        "date,breakfast,lunch,dinner,weight,total_cal\n"
+        "2026-01-01,100,,300,80.5,400\n"
+        "2026-01-02,500,600,,,1100\n"
+        "not a date,1,2,3,,6\n"
+        "2026-01-03,,,,,0\n"
+    )
+    return str(path)
+
+
+def logged(backend):
+    backend.kcalendar["2026-01-01"] = {"breakfast": 900, "lunch": None, "dinner": None, "weight": None}
+
+
+@pytest.mark.parametrize("policy, expected", [
+    ("fill", {"breakfast": 900, "lunch": None, "dinner": 300, "weight": 80.5}),
+    ("skip", {"breakfast": 900, "lunch": None, "dinner": None, "weight": None}),
+    ("overwrite", {"breakfast": 100, "lunch": None, "dinner": 300, "weight": 80.5}),
+])
+def test_policies_for_a_logged_day(backend, tmp_path, policy, expected):
+    logged(backend)
+    backend.import_file(write_csv(tmp_path), policy)
+    day = backend.kcalendar["2026-01-01"]
+    assert {key: day.get(key) for key in expected} == expected
+    # days not logged yet are added whatever the policy
+    assert backend.kcalendar["2026-01-02"]["lunch"] == 600
+    assert "2026-01-03" in backend.kcalendar
+    assert any(line.startswith("line 4:") for line in backend.printed)
+    assert "imported" in backend.printed[-1] and "(1 skipped as invalid)" in backend.printed[-1]
+
+
+def test_jsonl_rows_and_journal_lines(backend, tmp_path):
+    path = tmp_path / "days.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"date": "2026-02-01", "breakfast": 200}),
+        json.dumps({"date": "2026-02-02", "day": {"dinner": 700, "protein": 120}}),
+        "[1, 2]",
+        "{broken",
+    ]) + "\n")
+    backend.import_file(str(path))
+    assert backend.kcalendar["2026-02-01"]["breakfast"] == 200
+    assert backend.kcalendar["2026-02-02"]["protein"] == 120
+    assert "(2 skipped as invalid)" in backend.printed[-1]
+
+
+def test_import_is_saved(backend, tmp_path, monkeypatch):
+    # more rows than one batch
+    monkeypatch.setattr(backend, "IMPORT_BATCH", 2)
+    backend.import_file(write_csv(tmp_path), "overwrite")
+    backend.flush_saves()
+    engine = backend.open_storage("json", str(tmp_path))
+    saved = dict(engine.load())
+    assert sorted(saved) == ["2026-01-01", "2026-01-02", "2026-01-03"]
+    assert saved["2026-01-02"]["breakfast"] == 500
+
+
+def test_unknown_policy(backend, tmp_path):
+    with pytest.raises(ValueError):
+        backend.import_file(write_csv(tmp_path), "merge")
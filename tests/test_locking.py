@@ -0,0 +1,46 @@
+import threading
+from locking import RWLock
+
+
+def write_once(lock, done):
+    with lock.writing():
+        done.append(True)
+
+
+def test_readers_share_writer_waits():
+    lock = RWLock()
+    both_reading = threading.Barrier(2, timeout=5)
+
+    def read():
+        with lock.reading():
+            # only gets past when both readers are inside together
+            both_reading.wait()
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    assert not both_reading.broken
+
+    done = []
+    with lock.reading():
+        writer = threading.Thread(target=write_once, args=(lock, done))
+        writer.start()
+        writer.join(0.2)
+        assert not done
+    writer.join(5)
+    assert done
+
+
+def test_writer_takes_it_again():
+    lock = RWLock()
+    with lock.writing():
+        with lock.writing():
+            with lock.reading():
+                pass
+    done = []
+    writer = threading.Thread(target=write_once, args=(lock, done))
+    writer.start()
+    writer.join(5)
+    assert done
@@ -0,0 +1,64 @@
+import json
+import pytest
+
+
+def log(backend, date_str, breakfast):
+    assert backend.handle_command(f"log {date_str} b={breakfast}") is True
+
+
+def test_switch_keeps_each_profiles_days(backend, tmp_path):
+    log(backend, "2026-01-01", 100)
+    default = backend.kcalendar
+    assert backend.switch_profile("Work") is True
+    assert backend.load_profile() == "work"
+    assert "2026-01-01" not in backend.kcalendar
+    log(backend, "2026-01-01", 200)
+
+    assert backend.switch_profile("default") is False
+    # still loaded, so the same calendar comes back
+    assert backend.kcalendar is default
+    assert backend.kcalendar["2026-01-01"]["breakfast"] == 100
+    assert list(backend.resident_profiles) == ["work"]
+    assert json.loads((tmp_path / "kcalendar.profiles.json").read_text())["current"] == "default"
+
+    backend.switch_profile("work")
+    assert backend.kcalendar["2026-01-01"]["breakfast"] == 200
+
+
+def test_bad_names_and_budgets(backend):
+    for name in ["", "two words", "../up"]:
+        with pytest.raises(ValueError):
+            backend.switch_profile(name)
+    with pytest.raises(ValueError):
+        backend.set_profile_budget(-1)
+    backend.set_profile_budget(0)
+
+
+def test_least_recently_used_profile_goes_first(backend):
+    for name in ["default", "a", "b", "c"]:
+        if name != "default":
+            backend.switch_profile(name)
+        log(backend, "2026-01-01", 100)
+        backend.range_stats("2026-01-01", "2026-01-31")
+    assert list(backend.resident_profiles) == ["default", "a", "b"]
+
+    sizes = {name: backend.profile_nbytes(cal, heatmap) for name, (cal, _, heatmap) in backend.resident_profiles.items()}
+    # room for a and b only
+    backend.set_profile_budget((sizes["a"] + sizes["b"]) / 1_000_000)
+    assert list(backend.resident_profiles) == ["a", "b"]
+
+    backend.set_profile_budget(0)
+    assert not backend.resident_profiles
+    # closed profiles are read again from disk
+    backend.switch_profile("default")
+    assert backend.kcalendar["2026-01-01"]["breakfast"] == 100
+
+
+def test_profile_size_counts_range_totals_and_heatmap(backend):
+    cal = backend.kcalendar
+    log(backend, "2026-01-01", 100)
+    assert backend.profile_nbytes(cal, backend.heatmap_cache) == cal.columns.nbytes() + cal.ranges.nbytes()
+    backend.range_stats(None, None)
+    backend.year_buckets(2026)
+    assert cal.ranges.nbytes() > 0
+    assert backend.profile_nbytes(cal, backend.heatmap_cache) == cal.columns.nbytes() + cal.ranges.nbytes() + 365
@@ -0,0 +1,139 @@
+import datetime
+import random
+import pytest
+from storage import MEALS, PROTEIN_KEY, WEIGHT_KEY
+from ranges import BLOCK
+
+
+def date_at(first, i):
+    return (first + datetime.timedelta(days=i)).isoformat()
+
+
+def expected_stats(days, start, end, goal):
+    # range_stats worked out the slow way from {date: day}
+    picked = [days[d] for d in sorted(days) if start <= d <= end]
+    calories = [sum(day[meal] or 0 for meal in MEALS) for day in picked]
+    protein = [day[PROTEIN_KEY] for day in picked if day[PROTEIN_KEY] is not None]
+    weights = [day[WEIGHT_KEY] for day in picked if day[WEIGHT_KEY] is not None]
+    return (
+        len(picked), sum(calories), len(protein), sum(p >= goal for p in protein),
+        weights[0] if weights else None, weights[-1] if weights else None,
+    )
+
+
+def range_stats(backend, start, end, goal):
+    stats = backend.range_stats(start, end, goal)
+    return (
+        stats.days, stats.sums["calories"], stats.counts[PROTEIN_KEY], stats.protein_hits,
+        stats.first_weight, stats.last_weight,
+    )
+
+
+def random_day(rng):
+    return {
+        "breakfast": rng.choice([None, 300, 450]), "lunch": rng.choice([None, 600]), "dinner": 700,
+        "burnt": None, "protein": rng.choice([None, 90, 130]), "weight": rng.choice([None, 80.5, 90.0]),
+    }
+
+
+def test_range_stats_against_brute_force(backend):
+    rng = random.Random(1)
+    first = datetime.date(2024, 6, 1)
+    span = 4 * BLOCK
+    days = {}
+    for i in rng.sample(range(span), span // 2):
+        days[date_at(first, i)] = random_day(rng)
+    for date_str, day in days.items():
+        backend.kcalendar[date_str] = day
+
+    for step in range(400):
+        start = date_at(first, rng.randrange(-30, span))
+        end = date_at(datetime.date.fromisoformat(start), rng.randrange(0, 2 * BLOCK))
+        goal = rng.choice([80, 100, 120])
+        assert range_stats(backend, start, end, goal) == expected_stats(days, start, end, goal), (start, end)
+        if step % 4 == 0:
+            # old days, new days, and days before the first, so the index
+            # grows both ways
+            date_str = date_at(first, rng.randrange(-BLOCK, span + BLOCK))
+            days[date_str] = random_day(rng)
+            backend.kcalendar[date_str] = days[date_str]
+
+
+def test_range_stats_open_ends_and_empty(backend):
+    stats = backend.range_stats(None, None)
+    assert (stats.days, stats.first_weight, stats.protein_hits) == (0, None, None)
+    assert stats.mean("calories") is None
+
+    backend.kcalendar["2026-01-01"] = {"breakfast": 100, "weight": 80.0}
+    backend.kcalendar["2026-01-03"] = {"breakfast": 300, "weight": 79.0}
+    stats = backend.range_stats(None, None)
+    assert (stats.days, stats.sums["calories"], stats.first_weight, stats.last_weight) == (2, 400, 80.0, 79.0)
+    assert stats.mean("breakfast") == pytest.approx(200)
+    assert backend.range_stats("2026-01-02", None).days == 1
+    assert backend.range_stats(None, "2025-12-31").days == 0
+
+
+def expected_average(days, key, window, date_str):
+    end = datetime.date.fromisoformat(date_str)
+    values = []
+    for i in range(window):
+        day = days.get(date_at(end, -i))
+        if day is None:
+            continue
+        value = sum(day[meal] or 0 for meal in MEALS) if key == "calories" else day[key]
+        if value is not None:
+            values.append(value)
+    return sum(values) / len(values) if values else None
+
+
+@pytest.mark.parametrize("key", ["calories", PROTEIN_KEY, WEIGHT_KEY])
+@pytest.mark.parametrize("window", [1, 7, 30])
+def test_moving_averages_against_brute_force(backend, key, window):
+    rng = random.Random(window)
+    first = datetime.date(2026, 1, 1)
+    days = {date_at(first, i): random_day(rng) for i in rng.sample(range(120), 70)}
+    for date_str, day in days.items():
+        backend.kcalendar[date_str] = day
+
+    start, end = date_at(first, -10), date_at(first, 130)
+    averages = backend.moving_averages(key, window, start, end)
+    # every day asked for, including those before and after the history
+    assert [date_str for date_str, _ in averages] == [date_at(first, i) for i in range(-10, 131)]
+    for date_str, average in averages:
+        assert average == pytest.approx(expected_average(days, key, window, date_str)), date_str
+
+
+def test_moving_averages_default_to_the_logged_days(backend):
+    assert backend.moving_averages("calories", 7) == []
+    backend.kcalendar["2026-01-01"] = {"breakfast": 100}
+    backend.kcalendar["2026-01-03"] = {"breakfast": 300}
+    assert backend.moving_averages("calories", 7) == [("2026-01-01", 100), ("2026-01-02", 100), ("2026-01-03", 200)]
+    assert backend.moving_averages(WEIGHT_KEY, 7) == [("2026-01-01", None), ("2026-01-02", None), ("2026-01-03", None)]
+
+
+def test_calorie_buckets(backend):
+    from ranges import NO_LOG, LOGGED, WELL_UNDER, UNDER, OVER, WELL_OVER, calorie_buckets
+    for i, dinner in enumerate([1000, 1950, 2050, 2300]):
+        backend.kcalendar[f"2026-01-0{i + 1}"] = {"dinner": dinner}
+    backend.kcalendar["2026-01-06"] = {}
+    column_slice = backend.kcalendar.slice("2026-01-01", "2026-01-06")
+    assert list(calorie_buckets(column_slice, 2000)) == [WELL_UNDER, UNDER, OVER, WELL_OVER, NO_LOG, WELL_UNDER]
+    assert list(calorie_buckets(column_slice, None)) == [LOGGED] * 4 + [NO_LOG, LOGGED]
+
+
+def test_year_buckets_cover_the_year_and_follow_edits(backend):
+    from ranges import NO_LOG, LOGGED, UNDER, WELL_OVER
+    backend.kcalendar["2024-03-01"] = {"dinner": 500}
+    buckets = backend.year_buckets(2024)
+    # a leap year, the history starting part way through it
+    assert len(buckets) == 366
+    assert buckets[31 + 29] == LOGGED and buckets.count(NO_LOG) == 365
+    assert len(backend.year_buckets(2023)) == 365 and not any(backend.year_buckets(2025))
+
+    settings = backend.get_settings()
+    settings["calorie_goal"] = 510
+    backend.save_settings(settings)
+    assert backend.year_buckets(2024)[60] == UNDER
+    # a changed day drops its year from the cache
+    backend.ensure_day("2024-03-01")["dinner"] = 900
+    assert backend.year_buckets(2024)[60] == WELL_OVER
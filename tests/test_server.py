@@ -0,0 +1,18 @@
+import pytest
+import server
+
+
+def test_views_and_posts(backend):
+    assert server.post_log(["log", "2026-01-30"], {"b": 550, "w": 80.5})["total_cal"] == 550
+    assert server.post_log(["update", "2026-01-30"], {"l": 300})["total_cal"] == 850
+    assert server.get_view(["day", "2026-01-30"])["lunch"] == 300
+    assert server.get_view(["week", "2026-01-26"])["days"] == 1
+    assert server.get_view(["nope"]) is None
+    with pytest.raises(ValueError):
+        server.post_log(["log", "2026-01-30"], {"zz": 1})
+
+
+def test_year_span_is_capped(backend):
+    assert len(server.get_view(["year", "2001", str(2000 + server.MAX_YEARS)])) == server.MAX_YEARS
+    with pytest.raises(ValueError):
+        server.get_view(["year", "1", "9999"])
@@ -0,0 +1,223 @@
+import datetime
+import os
+import subprocess
+import sys
+import pytest
+import storage
+from storage import Calendar, BinaryStorage, DAY_KEYS
+from main import open_storage, STORAGE_ENGINES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENGINES = STORAGE_ENGINES
+
+
+def json_engine(directory):
+    return open_storage("json", directory)
+
+
+def day(breakfast, weight=None):
+    values = dict.fromkeys(DAY_KEYS)
+    values.update(breakfast=breakfast, weight=weight)
+    return values
+
+
+DAYS = [
+    ("2025-12-30", day(100, 80.5)),
+    ("2026-01-01", day(200)),
+    ("2026-01-02", day(None, 81.0)),
+    ("2026-02-15", day(400)),
+]
+
+
+@pytest.mark.parametrize("name", ENGINES)
+def test_write_day_flush_load(tmp_path, name):
+    engine = open_storage(name, str(tmp_path))
+    for date_str, values in DAYS:
+        engine.write_day(date_str, values)
+    engine.flush(iter(DAYS))
+    engine.close()
+
+    engine = open_storage(name, str(tmp_path))
+    assert sorted(engine.load()) == DAYS
+    assert sorted(engine.load("2026-01-01", "2026-01-31")) == DAYS[1:3]
+    engine.close()
+
+
+@pytest.mark.parametrize("name", ENGINES)
+def test_calendar_round_trip(tmp_path, name):
+    cal = Calendar(lambda: open_storage(name, str(tmp_path)))
+    for date_str, values in DAYS:
+        cal.save_day(date_str, values)
+    cal["2026-01-01"]["lunch"] = 350
+    cal.save_later("2026-01-01")
+    cal.close()
+
+    cal = Calendar(lambda: open_storage(name, str(tmp_path)))
+    assert cal["2026-01-01"]["lunch"] == 350
+    assert cal["2025-12-30"]["weight"] == 80.5
+    assert cal.dates() == [date_str for date_str, _ in DAYS]
+    cal.close()
+
+
+@pytest.mark.parametrize("source", ENGINES)
+@pytest.mark.parametrize("target", ENGINES)
+def test_migrate(tmp_path, source, target):
+    os.makedirs(tmp_path / "from")
+    os.makedirs(tmp_path / "to")
+    engine = open_storage(source, str(tmp_path / "from"))
+    engine.write_all(DAYS)
+    days = list(engine.load())
+    engine.close()
+    engine = open_storage(target, str(tmp_path / "to"))
+    engine.write_all(days)
+    engine.close()
+    assert sorted(open_storage(target, str(tmp_path / "to")).load()) == DAYS
+
+
+def test_journal_replay_stops_at_torn_line(tmp_path):
+    engine = json_engine(str(tmp_path))
+    engine.write_day("2026-01-01", day(100))
+    engine.write_day("2026-01-02", day(200))
+    with open(tmp_path / "kcalendar.journal", "a") as j:
+        j.write('{"date": "2026-01-03", "day": {"break')
+
+    assert list(json_engine(str(tmp_path)).load()) == [("2026-01-01", day(100)), ("2026-01-02", day(200))]
+
+
+def test_saves_in_a_row_replay(tmp_path, monkeypatch):
+    # text files written the way Windows writes them, "\n" becoming "\r\n"
+    def windows_open(file, mode="r", *args, **kwargs):
+        if "b" not in mode:
+            kwargs.setdefault("newline", "\r\n")
+        return open(file, mode, *args, **kwargs)
+    monkeypatch.setattr(storage, "open", windows_open, raising=False)
+
+    engine = json_engine(str(tmp_path))
+    assert list(engine.load()) == []
+    days = [(f"2026-01-0{i}", day(i * 100)) for i in range(1, 6)]
+    for date_str, values in days:
+        engine.write_day(date_str, values)
+        # where the next save trims to must be the journal's end, whatever
+        # line ending the platform uses for text files
+        assert engine._journal_offset == os.path.getsize(tmp_path / "kcalendar.journal")
+    assert b"\r" not in (tmp_path / "kcalendar.journal").read_bytes()
+
+    assert list(json_engine(str(tmp_path)).load()) == days
+
+
+def test_save_after_torn_journal_line_survives_reload(tmp_path):
+    cal = Calendar(lambda: json_engine(str(tmp_path)))
+    cal.save_day("2026-01-01", day(100))
+    cal.engine.close()
+    # a crash part way through the next save
+    with open(tmp_path / "kcalendar.journal", "a") as j:
+        j.write('{"date": "2026-01-02", "day": {"breakf')
+
+    cal = Calendar(lambda: json_engine(str(tmp_path)))
+    assert cal.get("2026-01-02") is None
+    cal.save_day("2026-01-03", day(300))
+
+    cal = Calendar(lambda: json_engine(str(tmp_path)))
+    assert cal["2026-01-01"]["breakfast"] == 100
+    assert cal["2026-01-03"]["breakfast"] == 300
+    assert cal.get("2026-01-02") is None
+
+
+def test_windowed_json_load_matches_full_load(tmp_path):
+    engine = json_engine(str(tmp_path))
+    days = [(f"{year}-{month:02d}-15", day(year * 100 + month)) for year in range(1990, 2027) for month in range(1, 13)]
+    engine.write_all(days)
+    for start, end in [("1989-01-01", "1990-03-01"), ("2005-06-15", "2005-09-14"), ("2026-11-01", None), ("2030-01-01", None)]:
+        expected = [(d, v) for d, v in days if d >= start and (end is None or d <= end)]
+        assert list(json_engine(str(tmp_path)).load(start, end)) == expected
+
+
+def check_changes(directory, name):
+    # another engine on the same files stands in for another process
+    writer = open_storage(name, directory)
+    reader = open_storage(name, directory)
+    writer.write_day("2026-01-01", day(100))
+    assert list(reader.load()) == [("2026-01-01", day(100))]
+    assert reader.changes() is None
+
+    writer.write_day("2026-01-02", day(200))
+    # before the first day, so the binary file grows backwards
+    writer.write_day("2024-06-01", day(300))
+    # sharded hands back whole months, so other days may come too
+    changed = dict(reader.changes())
+    assert (changed["2024-06-01"], changed["2026-01-02"]) == (day(300), day(200))
+    assert reader.changes() is None
+
+    # more saves than the binary file's log holds
+    dates = [datetime.date(2025, 1, 1) + datetime.timedelta(days=i) for i in range(BinaryStorage.LOG + 10)]
+    for i, date in enumerate(dates):
+        writer.write_day(date.isoformat(), day(i))
+    changed = dict(reader.changes())
+    assert all(changed[date.isoformat()] == day(i) for i, date in enumerate(dates))
+    assert reader.changes() is None
+    writer.close()
+    reader.close()
+
+
+@pytest.mark.parametrize("name", ENGINES)
+def test_changes_from_another_process(tmp_path, name):
+    check_changes(str(tmp_path), name)
+
+
+def test_binary_mapped_only_while_in_use(tmp_path, monkeypatch):
+    # how it runs on windows
+    monkeypatch.setattr(BinaryStorage, "keep_mapped", False)
+    check_changes(str(tmp_path), "binary")
+    engine = open_storage("binary", str(tmp_path))
+    assert len(list(engine.load())) == BinaryStorage.LOG + 13
+    assert engine._map is None
+
+
+def test_binary_version_1_file_is_upgraded(tmp_path):
+    base = datetime.date(2026, 1, 1).toordinal()
+    engine = open_storage("binary", str(tmp_path))
+    flags, values = engine._pack(day(100, 80.5))
+    with open(tmp_path / "kcalendar.bin", "wb") as f:
+        f.write(BinaryStorage.HEADER_V1.pack(BinaryStorage.MAGIC, 1, BinaryStorage.RECORD.size, base, 2))
+        f.write(bytes(BinaryStorage.RECORD.size))
+        f.write(BinaryStorage.RECORD.pack(flags, *values))
+
+    assert list(engine.load()) == [("2026-01-02", day(100, 80.5))]
+    engine.write_day("2026-01-05", day(200))
+    engine.close()
+    assert list(open_storage("binary", str(tmp_path)).load()) == [("2026-01-02", day(100, 80.5)), ("2026-01-05", day(200))]
+
+
+# one process saving its own days while others save theirs
+WORKER = """
+import sys
+from storage import Calendar, JsonStorage, BinaryStorage
+sys.path.insert(0, sys.argv[1])
+from test_storage import day
+from main import open_storage
+directory, name, n, mapped = sys.argv[2], sys.argv[3], int(sys.argv[4]), sys.argv[5] == "mapped"
+JsonStorage.compact_at = 5
+BinaryStorage.keep_mapped = mapped
+cal = Calendar(lambda: open_storage(name, directory))
+for i in range(28):
+    cal.refresh()
+    cal.save_day(f"2026-{n + 1:02d}-{i + 1:02d}", day(n * 100 + i))
+    if i % 7 == 0:
+        cal.flush()
+cal.close()
+"""
+
+
+@pytest.mark.parametrize("name, mapped", [(name, "mapped") for name in ENGINES] + [("binary", "unmapped")])
+def test_processes_saving_together_lose_nothing(tmp_path, name, mapped):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    workers = [
+        subprocess.Popen([sys.executable, "-c", WORKER, os.path.dirname(__file__), str(tmp_path), name, str(n), mapped], env=env)
+        for n in range(3)
+    ]
+    assert [worker.wait(timeout=60) for worker in workers] == [0, 0, 0]
+
+    cal = Calendar(lambda: open_storage(name, str(tmp_path)))
+    for n in range(3):
+        for i in range(28):
+            assert cal[f"2026-{n + 1:02d}-{i + 1:02d}"]["breakfast"] == n * 100 + i